@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'doctor_search_app.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',   
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,10 +82,53 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # The test database is a file in the project root (git-ignored), not SQLite's
+        # default in-memory DB: ToggleSavedDoctorConcurrencyTests runs requests on
+        # several threads, and each thread needs its own connection to the same DB
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache (doctor directory responses)
+# Set REDIS_URL to share the cache between workers; locmem is per-process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Seconds a cached doctor list page may live (a directory change invalidates it sooner)
+DOCTOR_LIST_CACHE_TIMEOUT = 300
+
+# Seconds before the in-memory /doctors/suggest/ index is rebuilt to pick up ranking_score
+# changes from reviews (doctor writes rebuild it on the next lookup anyway)
+SUGGEST_INDEX_MAX_AGE = 300
+
+# Seconds CachedJWTAuthentication may reuse a User row (any save or delete drops it sooner)
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# One-time codes (OTPChallenge): lifetime and wrong guesses allowed per code
+OTP_TTL_SECONDS = 600
+OTP_MAX_ATTEMPTS = 5
+
+# Bayesian ranking_score prior: every doctor counts as having RANKING_PRIOR_WEIGHT extra
+# reviews at RANKING_PRIOR_MEAN (None = the global mean, stored in the RankingPrior table
+# and refreshed by `rebuild_ratings`)
+RANKING_PRIOR_WEIGHT = 5
+RANKING_PRIOR_MEAN = None
+
+# Share of requests timed for /api/metrics/ (1.0 = every request, 0 = off)
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '1.0'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -101,6 +147,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords; a login whose stored hash used another
+# hasher or other costs is rehashed with it (doctor_search_app.hashers). Pick the
+# costs with `manage.py benchmark_hashers --budget-ms N`. Argon2 needs argon2-cffi.
+PASSWORD_HASHERS = [
+    'doctor_search_app.hashers.PBKDF2PasswordHasher',
+    'doctor_search_app.hashers.ScryptPasswordHasher',
+    'doctor_search_app.hashers.Argon2PasswordHasher',
+]
+PASSWORD_HASHER_COSTS = {
+    'pbkdf2_sha256': {'iterations': int(os.environ.get('PBKDF2_ITERATIONS', '1000000'))},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+    'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -127,15 +187,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # settings.py
 
 REST_FRAMEWORK = {
-    # Use JWT for authentication
+    # Use JWT for authentication (simplejwt, with the User row cached)
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'doctor_search_app.authentication.CachedJWTAuthentication',
     ),
     
     # Enable filtering globally (optional, but good practice)
     'DEFAULT_FILTER_BACKEND': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+
+    # Token buckets for the auth/OTP views (doctor_search_app.throttling):
+    # "N/period" = burst of N, refilled at N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': '20/min',
+        'auth_username': '5/min',
+    },
 }
 
 # Optional: Configure JWT settings (e.g., token lifetime)
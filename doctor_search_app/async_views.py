@@ -0,0 +1,71 @@
+"""
+Async read endpoints for ASGI deployments, mounted under /api/async/.
+
+Same payloads, filters and keyset cursors as the DRF doctor and review
+views, but pages are read with the async ORM, so under ASGI a request
+doesn't hold a worker thread for its whole lifetime. They serve anonymous
+reads only: no authentication, no is_saved flag, and no response cache.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .models import Doctor
+from .serializers import DoctorSerializer, ReviewListSerializer
+from .views import DoctorViewSet, ReviewViewSet
+
+
+def error_response(exc):
+    # Same body as DRF's exception handler
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return JsonResponse(data, status=exc.status_code, safe=False)
+
+
+class AsyncListView(View):
+    """A keyset page of `viewset_class`'s filtered list queryset."""
+    viewset_class = None
+    serializer_class = None
+
+    def get_queryset(self, view):
+        return view.filter_queryset(view.get_queryset())
+
+    async def get(self, request):
+        # No authenticators: the viewset sees an AnonymousUser
+        view = self.viewset_class(request=Request(request), action='list', args=(), kwargs={}, format_kwarg=None)
+        paginator = view.paginator
+        try:
+            # Building the queryset may touch the schema (the FTS availability check), so it
+            # runs in the request's sync thread; the page query goes through the async ORM
+            queryset = await sync_to_async(self.get_queryset)(view)
+            page = await paginator.apaginate_queryset(queryset, view.request)
+        except APIException as exc:
+            return error_response(exc)
+        return JsonResponse(paginator.get_paginated_data(self.serializer_class(page, many=True).data))
+
+
+class AsyncDoctorListView(AsyncListView):
+    """GET /api/async/doctors/ -> DoctorViewSet's list: ?search=, ?near=, filters and ?ordering=."""
+    viewset_class = DoctorViewSet
+    serializer_class = DoctorSerializer
+
+
+class AsyncReviewListView(AsyncListView):
+    """GET /api/async/reviews/?doctor_id= -> ReviewViewSet's list, newest first."""
+    viewset_class = ReviewViewSet
+    serializer_class = ReviewListSerializer
+
+    def get_queryset(self, view):
+        return super().get_queryset(view).values(*ReviewListSerializer.value_fields)
+
+
+class AsyncDoctorDetailView(View):
+    """GET /api/async/doctors/<pk>/"""
+
+    async def get(self, request, pk):
+        try:
+            doctor = await Doctor.objects.aget(pk=pk)
+        except Doctor.DoesNotExist:
+            return JsonResponse({'detail': 'No Doctor matches the given query.'}, status=404)
+        return JsonResponse(DoctorSerializer(doctor).data)
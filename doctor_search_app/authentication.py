@@ -0,0 +1,54 @@
+"""
+JWT authentication that looks the user up in the cache before the database.
+
+simplejwt's JWTAuthentication loads the User row on every authenticated
+request. Here the row is cached for AUTH_USER_CACHE_TIMEOUT seconds and
+dropped whenever the user is saved or deleted (signals.user_changed), so
+deactivation, admin changes and password resets apply on the next request.
+Writes that bypass save() (queryset.update()) must call forget_user().
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+    # A request that read the old row before our commit may have cached it again
+    transaction.on_commit(lambda: cache.delete(user_cache_key(user_id)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        key = user_cache_key(user_id)
+        try:
+            user = cache.get(key)
+        except Exception:
+            # Cache unreachable: authenticate from the database as usual
+            return super().get_user(validated_token)
+
+        if user is None:
+            # Also rejects unknown and inactive users, which are never cached
+            user = super().get_user(validated_token)
+            try:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+            except Exception:
+                pass
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
@@ -0,0 +1,309 @@
+"""
+API benchmark suite: drives the main endpoints through the Django test client
+and records latency percentiles and SQL query counts per endpoint.
+
+Used by the `benchmark_api` command (full-size datasets, latency + queries)
+and by the test suite (small dataset, query counts only). Baselines live in
+benchmark_baseline.json next to this module.
+
+The second half compares serving models (`benchmark_serving`): the same
+read traffic through Django's WSGI handler on a thread pool and through its
+ASGI handler on an event loop, at the same number of requests in flight.
+"""
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from wsgiref.util import setup_testing_defaults
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Doctor
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str
+    data: dict = None
+    authenticated: bool = False
+
+
+def build_endpoints(doctor_id):
+    return [
+        Endpoint('doctor_list', 'get', '/api/doctors/'),
+        Endpoint('reviews_by_doctor', 'get', f'/api/reviews/?doctor_id={doctor_id}'),
+        Endpoint('reviews_mine', 'get', '/api/reviews/?mine=true', authenticated=True),
+        Endpoint('saved_doctors', 'get', '/api/saved-doctors/', authenticated=True),
+        Endpoint('toggle_saved', 'post', '/api/saved-doctors/toggle/', {'doctor_id': doctor_id}, authenticated=True),
+    ]
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def run_benchmarks(user, iterations=20, warmup=2):
+    """
+    Hit every endpoint `iterations` times as `user` (real JWT auth) and return
+    {name: {'p50_ms', 'p95_ms', 'queries', 'status'}}. `queries` is the worst
+    case seen, so a toggle that alternates save/unsave reports the larger one.
+
+    The response cache is cleared before every call so the numbers describe
+    the uncached path, where N+1 regressions would show up.
+    """
+    # The most-reviewed doctor makes ?doctor_id= the heaviest review page
+    doctor_id = Doctor.objects.order_by('-review_count', 'id').values_list('id', flat=True).first()
+    token = str(RefreshToken.for_user(user).access_token)
+    client = Client()
+
+    results = {}
+    for endpoint in build_endpoints(doctor_id):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if endpoint.authenticated else {}
+        request = getattr(client, endpoint.method)
+
+        def call():
+            if endpoint.data is None:
+                return request(endpoint.path, **headers)
+            return request(endpoint.path, data=endpoint.data, content_type='application/json', **headers)
+
+        for _ in range(warmup):
+            call()
+
+        timings, queries, status = [], 0, None
+        for _ in range(iterations):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = call()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+            status = response.status_code
+
+        results[endpoint.name] = {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': queries,
+            'status': status,
+        }
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def write_baseline(results, dataset, path=BASELINE_PATH):
+    baseline = {
+        'dataset': dataset,
+        'endpoints': {
+            name: {'queries': result['queries'], 'p95_ms': result['p95_ms']}
+            for name, result in results.items()
+        },
+    }
+    with open(path, 'w') as fh:
+        json.dump(baseline, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def compare_to_baseline(results, baseline, latency_tolerance=None):
+    """
+    List of human-readable regressions. Query counts must not exceed the
+    baseline; p95 latency is only checked when `latency_tolerance` is given
+    (e.g. 0.5 allows 50% headroom), since it depends on the machine.
+    """
+    failures = []
+    for name, result in results.items():
+        expected = baseline['endpoints'].get(name)
+        if expected is None:
+            failures.append(f'{name}: no baseline recorded')
+            continue
+        if result['status'] >= 400:
+            failures.append(f"{name}: HTTP {result['status']}")
+        if result['queries'] > expected['queries']:
+            failures.append(f"{name}: {result['queries']} queries (baseline {expected['queries']})")
+        if latency_tolerance is not None:
+            limit = expected['p95_ms'] * (1 + latency_tolerance)
+            if result['p95_ms'] > limit:
+                failures.append(f"{name}: p95 {result['p95_ms']:.1f}ms (limit {limit:.1f}ms)")
+    return failures
+
+
+# --- Serving models: WSGI + sync views vs ASGI + async views ---
+
+SERVING_HOST = 'testserver'
+
+
+def read_paths(doctor_id, prefix='/api/'):
+    """The read mix every serving scenario replays: list, search, detail, reviews."""
+    return [
+        f'{prefix}doctors/',
+        f'{prefix}doctors/?search=card',
+        f'{prefix}doctors/{doctor_id}/',
+        f'{prefix}reviews/?doctor_id={doctor_id}',
+    ]
+
+
+def wsgi_get(application, url):
+    path, _, query = url.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': SERVING_HOST}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(body)
+    finally:
+        # Fires request_finished, which closes the thread's database connection
+        body.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, url):
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'headers': [(b'host', SERVING_HOST.encode())], 'client': ('127.0.0.1', 0), 'server': (SERVING_HOST, 80),
+    }
+    sent = []
+    request_read = False
+
+    async def receive():
+        nonlocal request_read
+        if not request_read:
+            request_read = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels this wait once the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent[0]['status']
+
+
+def summarize(timings, statuses, elapsed):
+    return {
+        'requests': len(timings),
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'errors': sum(status >= 400 for status in statuses),
+    }
+
+
+def run_wsgi(urls, concurrency):
+    """Serve `urls` through WSGIHandler on `concurrency` threads, like a threaded WSGI server."""
+    application = WSGIHandler()
+
+    def call(url):
+        started = time.perf_counter()
+        status = wsgi_get(application, url)
+        return (time.perf_counter() - started) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, urls))
+    elapsed = time.perf_counter() - started
+    return summarize([ms for ms, _ in results], [status for _, status in results], elapsed)
+
+
+def run_asgi(urls, concurrency):
+    """Serve `urls` through ASGIHandler on one event loop with `concurrency` requests in flight."""
+    application = ASGIHandler()
+
+    async def drive():
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def call(url):
+            async with in_flight:
+                started = time.perf_counter()
+                status = await asgi_get(application, url)
+                return (time.perf_counter() - started) * 1000, status
+
+        return await asyncio.gather(*(call(url) for url in urls))
+
+    started = time.perf_counter()
+    results = asyncio.run(drive())
+    elapsed = time.perf_counter() - started
+    return summarize([ms for ms, _ in results], [status for _, status in results], elapsed)
+
+
+def compare_serving(doctor_id, concurrency=32, requests=400):
+    """
+    Replay `requests` reads of the read_paths() mix, `concurrency` at a time,
+    under three setups and return {scenario: summary}:
+
+    - wsgi+sync:  DRF views behind the WSGI handler (the current deployment)
+    - asgi+sync:  the same DRF views behind the ASGI handler (run in threads)
+    - asgi+async: the /api/async/ views behind the ASGI handler
+
+    Callers should disable the response cache first, or the sync doctor list
+    is measuring cache hits.
+    """
+    def mix(prefix):
+        paths = read_paths(doctor_id, prefix)
+        return [paths[i % len(paths)] for i in range(requests)]
+
+    return {
+        'wsgi+sync': run_wsgi(mix('/api/'), concurrency),
+        'asgi+sync': run_asgi(mix('/api/'), concurrency),
+        'asgi+async': run_asgi(mix('/api/async/'), concurrency),
+    }
+
+
+# --- Password hashing: login cost per hasher ---
+
+LOGIN_PATH = '/api/auth/login/'
+
+
+def hasher_available(hasher):
+    """False when the hasher's library (argon2-cffi, bcrypt) isn't installed."""
+    if not hasher.library:
+        return True
+    try:
+        hasher._load_library()
+    except ValueError:
+        return False
+    return True
+
+
+def time_verify(hasher, password, iterations=10):
+    """Median milliseconds for one check_password() against a hash made by `hasher`."""
+    encoded = hasher.encode(password, hasher.salt())
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        hasher.verify(password, encoded)
+        timings.append((time.perf_counter() - started) * 1000)
+    return percentile(timings, 50)
+
+
+def time_logins(username, password, iterations=10):
+    """Latency of full POSTs to the login view, as a summary() dict."""
+    client = Client()
+    timings, statuses = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request_started = time.perf_counter()
+        response = client.post(LOGIN_PATH, {'username': username, 'password': password}, content_type='application/json')
+        timings.append((time.perf_counter() - request_started) * 1000)
+        statuses.append(response.status_code)
+    return summarize(timings, statuses, time.perf_counter() - started)
@@ -0,0 +1,95 @@
+"""
+Response cache for the public doctor directory.
+
+Cached entries are keyed on a global "directory version" plus the normalized
+query string. Any Doctor or Review write bumps the version, which orphans
+every cached page at once (they simply expire) instead of hunting them down
+key by key. Works with any Django cache backend (locmem, Redis, memcached).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'doctors:directory-version'
+# Changes only when doctor rows do (not on review writes): versions the suggest index
+ROSTER_VERSION_KEY = 'doctors:roster-version'
+
+
+def _cache_timeout():
+    return getattr(settings, 'DOCTOR_LIST_CACHE_TIMEOUT', 300)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def get_directory_version():
+    return _get_version(VERSION_KEY)
+
+
+def get_roster_version():
+    return _get_version(ROSTER_VERSION_KEY)
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Counter was evicted: any fresh clock-based value is newer than the old one
+            cache.set(key, int(time.time() * 1000), None)
+
+
+def bump_directory_version(roster=False):
+    """
+    Invalidate every cached directory response once the current transaction
+    commits. Pass roster=True when doctor rows themselves were written.
+    """
+    keys = (VERSION_KEY, ROSTER_VERSION_KEY) if roster else (VERSION_KEY,)
+    # After commit, so a concurrent reader can't re-cache pre-commit data under the new version
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def response_cache_key(request, prefix='doctors:list'):
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    # Host is part of the key because pagination links are absolute URLs
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode()).hexdigest()
+    return f'{prefix}:v{get_directory_version()}:{digest}'
+
+
+def cached_response(request, build, prefix='doctors:list'):
+    """
+    Serve `build()` (a 200 DRF Response) from the cache, with an ETag derived
+    from the cache key so If-None-Match can be answered with a 304 without
+    touching the cache or the database.
+    """
+    cache_key = response_cache_key(request, prefix)
+    etag = '"%s"' % hashlib.md5(cache_key.encode()).hexdigest()
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        data = cache.get(cache_key)
+        if data is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data, _cache_timeout())
+        else:
+            response = Response(data)
+
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate; the 304 path is nearly free
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,100 @@
+"""
+Geohash grid index for "doctors near me" on any backend, SQLite included.
+
+Doctor.geo_cell stores the geohash of the doctor's coordinates. A geohash
+cell is a string prefix of every point inside it, so a cell is a range scan
+on the geo_cell index (`cell <= geo_cell < cell + '~'`). A radius query
+covers the circle's bounding box with a few cells, and only the rows in
+those cells get a haversine distance computed and sorted.
+"""
+import math
+
+from django.db.models import F, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored precision: cells of roughly 38m x 19m
+GEOHASH_PRECISION = 8
+# Most cells a radius query may turn into; coarser cells are used past that
+MAX_COVERING_CELLS = 16
+# Sorts after every geohash character
+CELL_END = '~'
+
+
+def _bits(precision):
+    """(longitude bits, latitude bits) of a geohash with `precision` characters."""
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+
+def _cell_index(lat, lng, precision):
+    """(row, column) of the grid cell holding the point; longitudes wrap around."""
+    lng_bits, lat_bits = _bits(precision)
+    row = int((lat + 90) / 180 * (1 << lat_bits))
+    col = int((lng + 180) % 360 / 360 * (1 << lng_bits))
+    return min(max(row, 0), (1 << lat_bits) - 1), min(col, (1 << lng_bits) - 1)
+
+
+def _cell_hash(row, col, precision):
+    """Interleave column and row bits (longitude first) and spell them in base32."""
+    lng_bits, lat_bits = _bits(precision)
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lng_bits -= 1
+            value = value << 1 | (col >> lng_bits) & 1
+        else:
+            lat_bits -= 1
+            value = value << 1 | (row >> lat_bits) & 1
+    return ''.join(BASE32[value >> 5 * (precision - 1 - i) & 31] for i in range(precision))
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    return _cell_hash(*_cell_index(lat, lng, precision), precision)
+
+
+def covering_cells(lat, lng, radius_km, max_cells=MAX_COVERING_CELLS):
+    """
+    Geohash cells covering the bounding box of the circle around (lat, lng),
+    at the finest precision that needs no more than `max_cells` of them.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # A degree of longitude shrinks towards the poles: size the box at its poleward edge
+    widest = math.cos(math.radians(max(abs(south), abs(north))))
+    dlng = dlat / widest if widest > 1e-9 else 180.0
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lng_bits, _ = _bits(precision)
+        row_lo, col_lo = _cell_index(south, lng - dlng, precision)
+        row_hi, col_hi = _cell_index(north, lng + dlng, precision)
+        columns = 1 << lng_bits if dlng >= 180 else (col_hi - col_lo) % (1 << lng_bits) + 1
+        if (row_hi - row_lo + 1) * columns <= max_cells or precision == 1:
+            break
+
+    return sorted({
+        _cell_hash(row, (col_lo + i) % (1 << lng_bits), precision)
+        for row in range(row_lo, row_hi + 1)
+        for i in range(columns)
+    })
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
+
+
+def distance_km_expression(lat, lng, lat_field='latitude', lng_field='longitude'):
+    """
+    haversine_km() from (lat, lng) to the row's coordinates as an ORM expression.
+    Django registers the trigonometric functions on SQLite, so this runs everywhere.
+    """
+    a = (
+        Power(Sin(Radians(F(lat_field) - lat) / 2), 2)
+        + math.cos(math.radians(lat)) * Cos(Radians(F(lat_field))) * Power(Sin(Radians(F(lng_field) - lng) / 2), 2)
+    )
+    # Least(): rounding can push the root a hair past 1, outside asin's domain
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), Value(1.0)))
@@ -0,0 +1,68 @@
+"""
+Password hashers whose cost comes from settings.PASSWORD_HASHER_COSTS.
+
+Django rehashes a password on every successful login whose stored hash was
+made by a hasher other than PASSWORD_HASHERS[0], or with different cost
+parameters (must_update). So changing the first hasher or its cost here
+moves every account over as its owner logs in, with no data migration.
+Use `manage.py benchmark_hashers` to pick a cost that fits the login
+latency budget.
+"""
+import math
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def configured_cost(algorithm, name, default):
+    return getattr(settings, 'PASSWORD_HASHER_COSTS', {}).get(algorithm, {}).get(name, default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return configured_cost(self.algorithm, 'iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+    def cost_for(self, factor):
+        """Cost parameters that would take `factor` times as long as the current ones."""
+        return {'iterations': max(1000, int(round(self.iterations * factor, -3)))}
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return configured_cost(self.algorithm, 'work_factor', hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return configured_cost(self.algorithm, 'block_size', hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return configured_cost(self.algorithm, 'parallelism', hashers.ScryptPasswordHasher.parallelism)
+
+    def cost_for(self, factor):
+        # N must be a power of two; time grows linearly with it
+        return {'work_factor': 2 ** max(1, math.floor(math.log2(self.work_factor * factor)))}
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs the argon2-cffi package."""
+
+    @property
+    def time_cost(self):
+        return configured_cost(self.algorithm, 'time_cost', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return configured_cost(self.algorithm, 'memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return configured_cost(self.algorithm, 'parallelism', hashers.Argon2PasswordHasher.parallelism)
+
+    def cost_for(self, factor):
+        # Scale passes and keep the memory hardness; below one pass, shrink memory instead
+        if self.time_cost * factor >= 1:
+            return {'time_cost': math.floor(self.time_cost * factor)}
+        return {'time_cost': 1, 'memory_cost': max(8 * self.parallelism, math.floor(self.memory_cost * self.time_cost * factor))}
@@ -0,0 +1,202 @@
+"""
+Doctor roster import: CSV, JSON array or NDJSON, streamed in bounded memory.
+
+Rows are validated and written a chunk at a time. A doctor is matched by
+its natural key (name, hospital) and upserted with
+bulk_create(update_conflicts=True); a row whose key is new but whose email
+belongs to an existing doctor updates (renames) that doctor instead. Bad
+rows are reported with their line/record number and skipped, the rest of
+the chunk still goes in.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from .directory_cache import bump_directory_version
+from .models import Doctor
+from .ratings import ranking_prior
+from .serializers import DoctorImportSerializer
+
+FORMATS = ('csv', 'json', 'ndjson')
+KEY_FIELDS = ('name', 'hospital')
+# Columns an import overwrites on a matched doctor (ratings are never imported)
+UPDATE_FIELDS = ['specialty', 'location', 'email', 'cell', 'image', 'latitude', 'longitude', 'geo_cell']
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    # Only the first `max_errors` are kept, so a hopeless file can't exhaust memory
+    errors: list = field(default_factory=list)
+    max_errors: int = 1000
+
+    def add_error(self, number, detail):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': detail})
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'failed': self.failed, 'errors': self.errors}
+
+
+# --- Readers: yield (row number, dict) ---
+
+def read_csv(stream):
+    # Row numbers are file lines, counting the header as line 1
+    for number, row in enumerate(csv.DictReader(stream), start=2):
+        # Empty cells mean "no value", not an empty string to validate
+        yield number, {key: (value if value != '' else None) for key, value in row.items() if key}
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, e
+
+
+def read_json(stream, buffer_size=64 * 1024):
+    """Records of a top-level JSON array, decoded incrementally rather than loaded whole."""
+    decoder = json.JSONDecoder()
+    buffer, position, number, started = '', 0, 0, False
+    while True:
+        chunk = stream.read(buffer_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            # Skip separators between records
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+            if position >= len(buffer):
+                break
+            if not started:
+                raise ValueError('Expected a JSON array of doctor records.')
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise
+                break  # record continues in the next chunk
+            number += 1
+            position = end
+            yield number, record
+        if not chunk:
+            return
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'ndjson': read_ndjson}
+
+
+# --- Import ---
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validate(chunk, serializer, report, initial_score):
+    """Valid rows of the chunk as unsaved Doctors keyed by (name, hospital); later rows win."""
+    doctors = {}
+    for number, record in chunk:
+        if not isinstance(record, dict):
+            report.add_error(number, {'non_field_errors': [str(record) if isinstance(record, Exception) else 'Expected an object.']})
+            continue
+        try:
+            data = serializer.run_validation(record)
+        except ValidationError as e:
+            report.add_error(number, e.detail)
+            continue
+        # ranking_score only applies to inserts: it isn't in UPDATE_FIELDS
+        doctor = Doctor(**data, ranking_score=initial_score)
+        doctor.assign_geo_cell()
+        doctors[(doctor.name, doctor.hospital)] = (number, doctor)
+    return doctors
+
+
+def _write(doctors, report):
+    names = {name for name, _ in doctors}
+    emails = {doctor.email for _, doctor in doctors.values()}
+    existing = Doctor.objects.filter(Q(name__in=names) | Q(email__in=emails)).values_list('id', *KEY_FIELDS, 'email')
+
+    existing_keys = set()
+    ids_by_email = {}
+    for pk, name, hospital, email in existing:
+        existing_keys.add((name, hospital))
+        ids_by_email.setdefault(email, []).append(pk)
+
+    upserts, renames = [], []
+    for key, (number, doctor) in doctors.items():
+        matches = ids_by_email.get(doctor.email, [])
+        if key not in existing_keys and len(matches) == 1:
+            doctor.pk = matches[0]
+            renames.append(doctor)
+        else:
+            upserts.append(doctor)
+
+    with transaction.atomic():
+        Doctor.objects.bulk_create(
+            upserts, update_conflicts=True, unique_fields=list(KEY_FIELDS), update_fields=UPDATE_FIELDS
+        )
+        Doctor.objects.bulk_update(renames, [*KEY_FIELDS, *UPDATE_FIELDS])
+
+    updated = sum(key in existing_keys for key in doctors) + len(renames)
+    report.updated += updated
+    report.created += len(doctors) - updated
+
+
+def _write_row_by_row(doctors, report):
+    """Retry a chunk the database rejected one row at a time, so only the offending rows fail."""
+    for key, (number, doctor) in doctors.items():
+        # The failed attempt may have assigned ids that were rolled back
+        doctor.pk = None
+        try:
+            _write({key: (number, doctor)}, report)
+        except DatabaseError as e:
+            report.add_error(number, {'non_field_errors': [f'Database error: {e}']})
+
+
+def import_doctors(stream, fmt='csv', chunk_size=1000, report=None):
+    """
+    Import a roster from a text stream and return an ImportReport. Each
+    chunk is written in its own transaction; a chunk the database rejects
+    is retried row by row, so only the rows at fault are reported.
+    """
+    if fmt not in READERS:
+        raise ValueError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    report = report or ImportReport()
+    serializer = DoctorImportSerializer()
+    # New doctors have no reviews yet: they rank at the prior mean
+    initial_score, _ = ranking_prior()
+
+    try:
+        for chunk in _chunks(READERS[fmt](stream), chunk_size):
+            doctors = _validate(chunk, serializer, report, initial_score)
+            if not doctors:
+                continue
+            try:
+                _write(doctors, report)
+            except DatabaseError:
+                _write_row_by_row(doctors, report)
+    except (ValueError, csv.Error) as e:
+        # The file itself is unreadable past this point: keep what was imported
+        report.add_error(None, {'non_field_errors': [f'Could not parse the file: {e}']})
+    finally:
+        if report.created or report.updated:
+            bump_directory_version(roster=True)
+    return report
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from doctor_search_app import benchmarks
+from doctor_search_app.synthetic import generate_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset into a throwaway test database, benchmark the main API '
+        'endpoints and fail if query counts or p95 latency exceed the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        dataset = benchmarks.load_baseline()['dataset']
+        parser.add_argument('--doctors', type=int, default=dataset['doctors'])
+        parser.add_argument('--users', type=int, default=dataset['users'])
+        parser.add_argument('--reviews-per-doctor', type=int, default=dataset['reviews_per_doctor'])
+        parser.add_argument('--saved-per-user', type=int, default=dataset['saved_per_user'])
+        parser.add_argument('--seed', type=int, default=dataset['seed'])
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='Allowed p95 slowdown over the baseline (0.5 = 50%%)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Record this run as the new baseline instead of comparing')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        dataset = {
+            'doctors': options['doctors'],
+            'users': options['users'],
+            'reviews_per_doctor': options['reviews_per_doctor'],
+            'saved_per_user': options['saved_per_user'],
+            'seed': options['seed'],
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if not User.objects.filter(username=f"synthetic_{dataset['seed']}_0").exists():
+                self.stdout.write(f"Seeding {dataset}...")
+                generate_dataset(**dataset)
+            user = User.objects.get(username=f"synthetic_{dataset['seed']}_0")
+            results = benchmarks.run_benchmarks(user, iterations=options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<20} {'p50 ms':>10} {'p95 ms':>10} {'queries':>8}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<20} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['queries']:>8}")
+
+        if options['update_baseline']:
+            benchmarks.write_baseline(results, dataset)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {benchmarks.BASELINE_PATH}'))
+            return
+
+        baseline = benchmarks.load_baseline()
+        tolerance = options['latency_tolerance'] if baseline['dataset'] == dataset else None
+        if tolerance is None:
+            self.stdout.write(self.style.WARNING('Dataset differs from the baseline: checking query counts only.'))
+        failures = benchmarks.compare_to_baseline(results, baseline, latency_tolerance=tolerance)
+        if failures:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All endpoints within baseline.'))
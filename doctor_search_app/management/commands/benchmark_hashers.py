@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils.module_loading import import_string
+
+from doctor_search_app import benchmarks
+from doctor_search_app.models import User
+
+PASSWORD = 'Benchmark-Passw0rd!'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure login latency and logins/second per core for every hasher in PASSWORD_HASHERS '
+        'at its configured cost, and suggest costs that fit a per-login budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='Logins timed per hasher')
+        parser.add_argument('--budget-ms', type=float, default=100.0, help='Target hashing time per login')
+
+    def handle(self, *args, **options):
+        hashers = [import_string(path)() for path in settings.PASSWORD_HASHERS]
+        rows = []
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Login throttles would stop the run after a few attempts
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        try:
+            for path, hasher in zip(settings.PASSWORD_HASHERS, hashers):
+                if not benchmarks.hasher_available(hasher):
+                    self.stdout.write(self.style.WARNING(f'{hasher.algorithm}: library not installed, skipped'))
+                    continue
+                verify_ms = benchmarks.time_verify(hasher, PASSWORD, options['iterations'])
+                # Only this hasher is listed, so the account is hashed with it and login won't rehash
+                with override_settings(PASSWORD_HASHERS=[path], REST_FRAMEWORK=rest_framework):
+                    username = f'hasher-bench-{hasher.algorithm}'
+                    User.objects.create_user(username=username, email=f'{username}@example.com', password=PASSWORD)
+                    login = benchmarks.time_logins(username, PASSWORD, options['iterations'])
+                rows.append((hasher, verify_ms, login))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        budget = options['budget_ms']
+        self.stdout.write(f"{'hasher':<14} {'verify ms':>10} {'login p50':>10} {'logins/s/core':>14} {'errors':>7}  cost for {budget:g}ms")
+        for hasher, verify_ms, login in rows:
+            suggested = ', '.join(f'{name}={value}' for name, value in hasher.cost_for(budget / verify_ms).items()) \
+                if hasattr(hasher, 'cost_for') else '-'
+            self.stdout.write(
+                f"{hasher.algorithm:<14} {verify_ms:>10.2f} {login['p50_ms']:>10.2f} "
+                f"{1000 / login['p50_ms']:>14.1f} {login['errors']:>7}  {suggested}"
+            )
+        self.stdout.write('Set the chosen costs in PASSWORD_HASHER_COSTS; accounts are rehashed as they log in.')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from doctor_search_app import benchmarks
+from doctor_search_app.models import Doctor
+from doctor_search_app.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset into a throwaway test database and compare read throughput '
+        'of the sync views under WSGI with the async views under ASGI at matched concurrency'
+    )
+
+    def add_arguments(self, parser):
+        dataset = benchmarks.load_baseline()['dataset']
+        parser.add_argument('--doctors', type=int, default=dataset['doctors'])
+        parser.add_argument('--users', type=int, default=dataset['users'])
+        parser.add_argument('--reviews-per-doctor', type=int, default=dataset['reviews_per_doctor'])
+        parser.add_argument('--seed', type=int, default=dataset['seed'])
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per scenario')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if not Doctor.objects.filter(email__startswith=f"synthetic_{options['seed']}-").exists():
+                self.stdout.write('Seeding...')
+                generate_dataset(
+                    doctors=options['doctors'], users=options['users'],
+                    reviews_per_doctor=options['reviews_per_doctor'], saved_per_user=0, seed=options['seed'],
+                )
+            doctor_id = Doctor.objects.order_by('-review_count', 'id').values_list('id', flat=True).first()
+            # Uncached: the DRF doctor list would otherwise be answered from the response cache
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                results = benchmarks.compare_serving(doctor_id, options['concurrency'], options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"concurrency {options['concurrency']}, {options['requests']} requests per scenario")
+        self.stdout.write(f"{'scenario':<12} {'req/s':>8} {'p50 ms':>10} {'p95 ms':>10} {'errors':>7}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12} {result['rps']:>8.1f} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['errors']:>7}"
+            )
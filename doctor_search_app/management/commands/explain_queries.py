@@ -0,0 +1,82 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from doctor_search_app.models import Doctor
+from doctor_search_app.views import DoctorViewSet, ReviewViewSet, SavedDoctorViewSet
+
+User = get_user_model()
+
+# (label, viewset, query string, needs an authenticated user)
+CASES = [
+    ('doctors: default ranking', DoctorViewSet, '', False),
+    ('doctors: ?ordering=name', DoctorViewSet, 'ordering=name', False),
+    ('doctors: ?ordering=-ranking_score', DoctorViewSet, 'ordering=-ranking_score', False),
+    ('doctors: ?specialty=&location=', DoctorViewSet, 'specialty={specialty}&location={location}', False),
+    ('doctors: ?search=', DoctorViewSet, 'search={specialty}', False),
+    ('doctors: ?near=', DoctorViewSet, 'near={near}&radius_km=10', False),
+    ('reviews: ?doctor_id=', ReviewViewSet, 'doctor_id={doctor_id}', False),
+    ('reviews: ?mine=true', ReviewViewSet, 'mine=true', True),
+    ('saved doctors', SavedDoctorViewSet, '', True),
+]
+
+# Plan lines that read a whole table: SQLite "SCAN t" without an index, PostgreSQL "Seq Scan"
+FULL_SCAN = re.compile(r'\bSCAN (?!.*\b(?:USING (?:COVERING )?INDEX|VIRTUAL TABLE)\b)|\bSeq Scan\b')
+SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the list query of every viewset and flag full table scans and unindexed sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit non-zero when a full scan is found')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just flagged ones')
+
+    def handle(self, *args, **options):
+        sample = Doctor.objects.order_by('id').first()
+        params = {
+            'doctor_id': sample.id if sample else 1,
+            'specialty': sample.specialty if sample else 'Cardiologist',
+            'location': sample.location if sample else 'Nairobi',
+            'near': f'{sample.latitude},{sample.longitude}' if sample and sample.geo_cell else '-1.2864,36.8172',
+        }
+        # Only the pk is used to filter, so an unsaved stand-in works on an empty database
+        user = User.objects.order_by('id').first() or User(pk=1)
+        factory = APIRequestFactory()
+
+        problems = 0
+        for label, viewset, query, authenticated in CASES:
+            request = Request(factory.get('/?' + query.format(**params)))
+            request.user = user if authenticated else AnonymousUser()
+
+            view = viewset()
+            view.action, view.kwargs, view.format_kwarg, view.request = 'list', {}, None, request
+            queryset = view.filter_queryset(view.get_queryset())
+            if view.paginator is not None:
+                # Explain the page query the paginator actually runs
+                queryset = queryset.order_by(*view.paginator.get_ordering(queryset))[:view.paginator.page_size]
+
+            plan = queryset.explain()
+            scans = [line.strip() for line in plan.splitlines() if FULL_SCAN.search(line)]
+            sorts = [line.strip() for line in plan.splitlines() if SORT.search(line)]
+
+            if scans or sorts:
+                problems += bool(scans)
+                self.stdout.write(self.style.WARNING(f'{label}:'))
+                for line in scans:
+                    self.stdout.write(f'    full scan: {line}')
+                for line in sorts:
+                    self.stdout.write(f'    sort:      {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label}: indexed'))
+            if options['verbose_plans']:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        if problems and options['fail_on_scan']:
+            raise CommandError(f'{problems} queries scan a full table.')
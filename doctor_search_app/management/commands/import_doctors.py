@@ -0,0 +1,36 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor_search_app.importer import FORMATS, ImportReport, import_doctors
+
+
+class Command(BaseCommand):
+    help = 'Upsert doctors from a CSV, JSON array or NDJSON roster, matched on (name, hospital) or email'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and written per batch')
+        parser.add_argument('--max-errors', type=int, default=50, help='Row errors to print')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Can't tell the format of {path.name}; pass --format.")
+
+        started = time.perf_counter()
+        report = ImportReport(max_errors=options['max_errors'])
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            import_doctors(stream, fmt, chunk_size=options['chunk_size'], report=report)
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"row {error['row']}: {error['errors']}"))
+        if report.failed > len(report.errors):
+            self.stdout.write(f'... and {report.failed - len(report.errors)} more failed rows')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} created, {report.updated} updated, {report.failed} failed in {elapsed:.1f}s.'
+        ))
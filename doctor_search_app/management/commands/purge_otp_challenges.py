@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from doctor_search_app.models import OTPChallenge
+
+
+class Command(BaseCommand):
+    help = 'Delete expired OTP challenges (run from cron, e.g. hourly)'
+
+    def handle(self, *args, **options):
+        expired = OTPChallenge.objects.filter(expires_at__lte=timezone.now())
+        # Nothing cascades from a challenge: a single indexed DELETE
+        deleted, _ = expired.delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired OTP challenges.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from doctor_search_app.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the stored rating sum/count/average of every doctor from the review table, '
+        'then the ranking prior and every ranking_score (schedule it, e.g. nightly)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('doctor_ids', nargs='*', type=int, help='Only rebuild these doctors')
+
+    def handle(self, *args, **options):
+        doctor_ids = options['doctor_ids'] or None
+        with transaction.atomic():
+            updated = rebuild_rating_aggregates(doctor_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} doctors.'))
@@ -1,171 +1,156 @@
 import random
+import time
 from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
+from django.db import transaction
 from doctor_search_app.models import Doctor, Review
+from doctor_search_app.ratings import rebuild_rating_aggregates
+from doctor_search_app.synthetic import (
+    FIRST_NAMES, bulk_insert, coordinates_near, create_reviews, create_users, in_chunks, synthetic_doctors
+)
 from django.utils.text import slugify
 
-User = get_user_model()
+# CURATED DOCTOR DATA (always the head of the dataset)
+# ---------------------------------------------------------
+# (Name, Specialty, Hospital, Location, Contact, GenderGuess)
+# Gender 'm' or 'f' helps us pick the right photo folder
+DOCTOR_DATA = [
+    ("Koome Muratha", "Cardiologist", "Nairobi Cardiac Rehab Centre", "Nairobi", "2721580", "m"),
+    ("Charles Kariuki", "Cardiologist", "Nairobi Hospital", "Nairobi", "2721609", "m"),
+    ("Dr Philip Kisyoka", "Cardiologist", "Nairobi Hospital", "Nairobi", "0722964288", "m"),
+    ("Dr Murithi Nyamu", "Cardiologist", "Nelson Awori", "Nairobi", "0722 433 130", "m"),
+    ("William I Okumu", "Cardiologist", "Consolidated Bank Hse", "Nairobi", "0722 320146", "m"),
+    
+    ("J.M Chakava", "Physician", "The Mater Hospital", "Nairobi", "020-2252815", "m"),
+    ("Paul Ngugi", "Diabetologist", "Hazina Towers", "Nairobi", "0722-726600", "m"),
+    ("Kassim Goke", "Physician", "Upper Hill Medical Centre", "Nairobi", "020-3424832", "m"),
+    ("R.M. Muraguri", "Gastroenterologist", "The Nairobi Hospital", "Nairobi", "020-2722302", "m"),
+    ("S.M. Kairu", "Gastroenterologist", "Menelik Medical Centre", "Nairobi", "020-3877028", "m"),
+    ("Prof Erastus O. Amayo", "Neurologist", "General Accident Hse", "Nairobi", "020-2722405", "m"),
+    
+    ("Dr Lucy Mutara", "Dentist", "Mpaka Plaza Westlands", "Nairobi", "0721502512", "f"),
+    ("Dr Sanjna K.", "Dentist", "Nairobi CBD", "Nairobi", "0722252549", "f"),
+    ("Dr Kasi Marani", "Dentist", "Hurlingham Medicare Plaza", "Nairobi", "2715239", "f"),
+    ("Dr William Obwaka", "Obs/Gyn", "NSSF Building", "Nairobi", "0716473326", "m"),
+    ("Dr James Kamau", "Obs/Gyn", "Exchange Building", "Nairobi", "020-310800", "m"),
+    ("Eunice J Cheserem", "Obs/Gyn", "Nairobi Hospital Drs Plaza", "Nairobi", "020-2846434", "f"),
+
+    ("Dr D M Kinuthia", "Paediatrician", "Aga Khan University Hospital", "Nairobi", "3740000", "m"),
+    ("C.A Okello (Mrs)", "Paediatrician", "Hurlingham Medical Centre", "Nairobi", "020-2712852", "f"),
+    ("Dr Anne Maina", "ENT Surgeon", "Optimum Medical Centre", "Nairobi", "0722 566 039", "f"),
+    
+    ("Dr Walter Otieno", "Paediatrician", "Drs. Plaza-Kisumu", "Kisumu", "0722144814", "m"),
+    ("Dr Janet Oyieko", "Paediatrician", "Oasis Medical Centre", "Kisumu", "0721 99 69 88", "f"),
+    ("Dr Leah Okin", "Obs/Gyn", "Oasis Medical Centre", "Kisumu", "0727 79 19 05", "f"),
+    
+    ("Satish Mangal Vaghela", "Dentist", "Nyali Dental Care", "Mombasa", "041-314953", "m"),
+    ("Dr Salaah A.O", "Dentist", "TSS Towers", "Mombasa", "0733 39 39 39", "m"),
+    ("Dr C.E Muyodi", "Physician", "Pandya Memorial Hospital", "Mombasa", "2230674", "m"),
+    ("Dr F. Gikandi", "Paediatrician", "Aga Khan Hospital Mombasa", "Mombasa", "0722 684 176", "f"),
+]
+
+
+def portrait_url(name, gender):
+    # We use randomuser.me IDs.
+    # Men IDs: 1-99, Women IDs: 1-99.
+    # We use the name length as a seed to keep the image consistent for the same name every time we run seeds.
+    img_id = (len(name) * 3) % 99
+    if img_id == 0: img_id = 1
+
+    gender_path = "men" if gender == "m" else "women"
+    return f"https://randomuser.me/api/portraits/{gender_path}/{img_id}.jpg"
+
 
 class Command(BaseCommand):
-    help = 'Load doctor data with images and reviews'
+    help = (
+        'Load the curated doctor list with images and reviews. Pass --doctors/--users to '
+        'pad it with synthetic rows for load testing (written with batched bulk_create).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=len(DOCTOR_DATA),
+                            help='Total doctors; the curated list comes first, the rest is synthetic')
+        parser.add_argument('--users', type=int, default=len(FIRST_NAMES), help='Number of reviewer accounts')
+        parser.add_argument('--reviews-per-doctor', type=int, default=None,
+                            help='Reviews per doctor (default: 4 to 7 at random)')
+        parser.add_argument('--seed', type=int, default=None, help='RNG seed for a reproducible dataset')
+        parser.add_argument('--batch-size', type=int, default=5000)
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
         self.stdout.write("Starting database seeding...")
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        per_doctor = options['reviews_per_doctor'] or (4, 7)
+
+        with transaction.atomic():
+            # 1. CREATE DUMMY USERS (To write the reviews)
+            # ---------------------------------------------------------
+            usernames = [
+                f"{FIRST_NAMES[i % len(FIRST_NAMES)].lower()}{i + 1}" for i in range(options['users'])
+            ]
+            user_ids = create_users(usernames, batch_size)
+            self.stdout.write(f"Created/Loaded {len(user_ids)} dummy users.")
+
+            # 2. CURATED HEAD
+            # ---------------------------------------------------------
+            curated = DOCTOR_DATA[:options['doctors']]
+            existing = {}
+            for chunk in in_chunks([row[0] for row in curated]):
+                existing.update((doctor.name, doctor) for doctor in Doctor.objects.filter(name__in=chunk))
 
-        # 1. CREATE DUMMY USERS (To write the reviews)
-        # ---------------------------------------------------------
-        dummy_names = [
-            "Wanjiku", "Otieno", "Kamau", "Achieng", "Odhiambo", "Nyambura", "Ochieng", 
-            "Njoroge", "Mwangi", "Chebet", "Kipkorir", "Adhiambo", "Wambui", "Maina", 
-            "Kariuki", "Mutua", "Omondi", "Anyango", "Juma", "Njeri"
-        ]
-        
-        users = []
-        for name in dummy_names:
-            username = f"{name.lower()}{random.randint(1, 99)}"
-            email = f"{username}@example.com"
-            user, created = User.objects.get_or_create(username=username, email=email)
-            if created:
-                user.set_password("password123")
-                user.save()
-            users.append(user)
-        
-        self.stdout.write(f"Created/Loaded {len(users)} dummy users.")
-
-
-        # 2. REVIEW COMMENTS BANK
-        # ---------------------------------------------------------
-        good_reviews = [
-            "Excellent service, very professional.",
-            "Saved my life! Best doctor in the region.",
-            "Very kind and took time to explain everything.",
-            "Great facility and friendly staff.",
-            "Highly recommended for anyone with similar issues.",
-            "The treatment worked wonders. Thank you daktari.",
-            "Very knowledgeable and precise.",
-            "Wait time was short and the service was top notch."
-        ]
-        
-        avg_reviews = [
-            "Good doctor but the queue was too long.",
-            "Service was okay, but the receptionist was rude.",
-            "Decent experience, but a bit expensive.",
-            "Treatment was effective but follow-up was slow.",
-            "Average experience. Nothing special."
-        ]
-        
-        bad_reviews = [
-            "Kept me waiting for 3 hours!",
-            "Did not listen to my concerns at all.",
-            "Very expensive for the level of service provided.",
-            "Rushed through the consultation.",
-            "I would not recommend this clinic.",
-            "Very unprofessional staff."
-        ]
-
-        # 3. DOCTOR DATA
-        # ---------------------------------------------------------
-        # (Name, Specialty, Hospital, Location, Contact, GenderGuess)
-        # Gender 'm' or 'f' helps us pick the right photo folder
-        doctor_data = [
-            ("Koome Muratha", "Cardiologist", "Nairobi Cardiac Rehab Centre", "Nairobi", "2721580", "m"),
-            ("Charles Kariuki", "Cardiologist", "Nairobi Hospital", "Nairobi", "2721609", "m"),
-            ("Dr Philip Kisyoka", "Cardiologist", "Nairobi Hospital", "Nairobi", "0722964288", "m"),
-            ("Dr Murithi Nyamu", "Cardiologist", "Nelson Awori", "Nairobi", "0722 433 130", "m"),
-            ("William I Okumu", "Cardiologist", "Consolidated Bank Hse", "Nairobi", "0722 320146", "m"),
-            
-            ("J.M Chakava", "Physician", "The Mater Hospital", "Nairobi", "020-2252815", "m"),
-            ("Paul Ngugi", "Diabetologist", "Hazina Towers", "Nairobi", "0722-726600", "m"),
-            ("Kassim Goke", "Physician", "Upper Hill Medical Centre", "Nairobi", "020-3424832", "m"),
-            ("R.M. Muraguri", "Gastroenterologist", "The Nairobi Hospital", "Nairobi", "020-2722302", "m"),
-            ("S.M. Kairu", "Gastroenterologist", "Menelik Medical Centre", "Nairobi", "020-3877028", "m"),
-            ("Prof Erastus O. Amayo", "Neurologist", "General Accident Hse", "Nairobi", "020-2722405", "m"),
-            
-            ("Dr Lucy Mutara", "Dentist", "Mpaka Plaza Westlands", "Nairobi", "0721502512", "f"),
-            ("Dr Sanjna K.", "Dentist", "Nairobi CBD", "Nairobi", "0722252549", "f"),
-            ("Dr Kasi Marani", "Dentist", "Hurlingham Medicare Plaza", "Nairobi", "2715239", "f"),
-            ("Dr William Obwaka", "Obs/Gyn", "NSSF Building", "Nairobi", "0716473326", "m"),
-            ("Dr James Kamau", "Obs/Gyn", "Exchange Building", "Nairobi", "020-310800", "m"),
-            ("Eunice J Cheserem", "Obs/Gyn", "Nairobi Hospital Drs Plaza", "Nairobi", "020-2846434", "f"),
-
-            ("Dr D M Kinuthia", "Paediatrician", "Aga Khan University Hospital", "Nairobi", "3740000", "m"),
-            ("C.A Okello (Mrs)", "Paediatrician", "Hurlingham Medical Centre", "Nairobi", "020-2712852", "f"),
-            ("Dr Anne Maina", "ENT Surgeon", "Optimum Medical Centre", "Nairobi", "0722 566 039", "f"),
-            
-            ("Dr Walter Otieno", "Paediatrician", "Drs. Plaza-Kisumu", "Kisumu", "0722144814", "m"),
-            ("Dr Janet Oyieko", "Paediatrician", "Oasis Medical Centre", "Kisumu", "0721 99 69 88", "f"),
-            ("Dr Leah Okin", "Obs/Gyn", "Oasis Medical Centre", "Kisumu", "0727 79 19 05", "f"),
-            
-            ("Satish Mangal Vaghela", "Dentist", "Nyali Dental Care", "Mombasa", "041-314953", "m"),
-            ("Dr Salaah A.O", "Dentist", "TSS Towers", "Mombasa", "0733 39 39 39", "m"),
-            ("Dr C.E Muyodi", "Physician", "Pandya Memorial Hospital", "Mombasa", "2230674", "m"),
-            ("Dr F. Gikandi", "Paediatrician", "Aga Khan Hospital Mombasa", "Mombasa", "0722 684 176", "f"),
-        ]
-
-        # 4. LOOP & CREATE
-        # ---------------------------------------------------------
-        count = 0
-        for name, specialty, hospital, location, cell, gender in doctor_data:
-            
-            # Generate Image URL
-            # We use randomuser.me IDs. 
-            # Men IDs: 1-99, Women IDs: 1-99.
-            # We use the name length as a seed to keep the image consistent for the same name every time we run seeds.
-            img_id = (len(name) * 3) % 99 
-            if img_id == 0: img_id = 1
-            
-            gender_path = "men" if gender == "m" else "women"
-            image_url = f"https://randomuser.me/api/portraits/{gender_path}/{img_id}.jpg"
-
-            # Create Doctor
-            doctor, created = Doctor.objects.get_or_create(
-                name=name,
-                defaults={
-                    'specialty': specialty,
-                    'hospital': hospital,
-                    'location': location,
-                    'cell': cell,
-                    'email': f"{slugify(name)}@example.com",
-                    'image': image_url
-                }
+            new_doctors = []
+            for name, specialty, hospital, location, cell, gender in curated:
+                image_url = portrait_url(name, gender)
+                if name in existing:
+                    # If doctor already existed, update the image just in case
+                    existing[name].image = image_url
+                    if existing[name].latitude is None:
+                        existing[name].latitude, existing[name].longitude = coordinates_near(rng, location)
+                        existing[name].assign_geo_cell()
+                else:
+                    latitude, longitude = coordinates_near(rng, location)
+                    doctor = Doctor(
+                        name=name,
+                        specialty=specialty,
+                        hospital=hospital,
+                        location=location,
+                        cell=cell,
+                        email=f"{slugify(name)}@example.com",
+                        image=image_url,
+                        latitude=latitude,
+                        longitude=longitude,
+                    )
+                    doctor.assign_geo_cell()
+                    new_doctors.append(doctor)
+            Doctor.objects.bulk_update(
+                existing.values(), ['image', 'latitude', 'longitude', 'geo_cell'], batch_size=batch_size
+            )
+            bulk_insert(new_doctors, Doctor, batch_size)
+
+            # 3. SYNTHETIC TAIL (only what is missing to reach --doctors)
+            # ---------------------------------------------------------
+            synthetic = Doctor.objects.filter(email__startswith='synthetic-')
+            have = synthetic.count()
+            bulk_insert(
+                synthetic_doctors(rng, options['doctors'] - len(curated) - have, start=have),
+                Doctor, batch_size
             )
-            
-            # If doctor already existed, update the image just in case
-            if not created:
-                doctor.image = image_url
-                doctor.save()
-
-            # Create 4 to 7 Reviews
-            review_count = random.randint(4, 7)
-            # Shuffle users to get random reviewers
-            random.shuffle(users)
-            
+
+            seeded = Doctor.objects.filter(name__in=[row[0] for row in curated]) | synthetic
+            doctor_ids = list(seeded.order_by('id').values_list('id', flat=True))
+
+            # 4. REVIEWS
+            # ---------------------------------------------------------
             # Delete existing reviews to prevent duplicates piling up if we run seeds twice
-            Review.objects.filter(doctor=doctor).delete()
-
-            for i in range(review_count):
-                user = users[i]
-                
-                # Weighted Randomness: Doctors mostly get good reviews, some bad
-                # 70% Good, 20% Avg, 10% Bad
-                rand_val = random.random()
-                if rand_val < 0.7:
-                    rating = random.randint(8, 10)
-                    comment = random.choice(good_reviews)
-                elif rand_val < 0.9:
-                    rating = random.randint(5, 7)
-                    comment = random.choice(avg_reviews)
-                else:
-                    rating = random.randint(1, 4)
-                    comment = random.choice(bad_reviews)
-                
-                Review.objects.create(
-                    doctor=doctor,
-                    user=user,
-                    rating=rating,
-                    comment=comment
-                )
-
-            count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Successfully seeded {count} doctors with images and reviews.'))
\ No newline at end of file
+            Review.objects.filter(doctor__in=seeded.values('id')).delete()
+            # Weighted Randomness: Doctors mostly get good reviews, some bad
+            create_reviews(rng, doctor_ids, user_ids, per_doctor, batch_size)
+
+            # 5. REFRESH STORED RATING AGGREGATES
+            # ---------------------------------------------------------
+            rebuild_rating_aggregates(seeded.values('id'))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully seeded {len(doctor_ids)} doctors with images and reviews in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from doctor_search_app.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox mail in batches over one SMTP connection per batch, with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                # More may be waiting: go again without sleeping
+                self.stdout.write(f'Sent {sent}, failed {failed}.')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
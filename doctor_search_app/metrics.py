@@ -0,0 +1,204 @@
+"""
+In-process request metrics, rendered in the Prometheus text format.
+
+RequestMetricsMiddleware times sampled requests per route. SQL is counted
+by an execute wrapper installed on every database connection, which adds
+to the tally of the request running in the current context (contextvars
+follow sync_to_async into worker threads, so async views are covered
+too). Outside a sampled request the wrapper is a single ContextVar lookup.
+
+Each worker process keeps its own numbers.
+"""
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PREFIX = 'doctor_search'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name, self.documentation, self.label_names = name, documentation, tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram(Counter):
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            # [count per bucket..., total count, sum]
+            series = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", bound)])} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {series[-2]}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-2]}')
+        return lines
+
+
+REQUESTS = Counter(
+    f'{PREFIX}_http_requests_total', 'Sampled requests by route, method and status class.',
+    ('route', 'method', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    f'{PREFIX}_http_request_duration_seconds', 'Wall time of sampled requests.', ('route',),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    f'{PREFIX}_http_request_sql_seconds', 'Time spent executing SQL per sampled request.', ('route',),
+)
+REQUEST_SQL_QUERIES = Histogram(
+    f'{PREFIX}_http_request_sql_queries', 'SQL statements per sampled request.', ('route',),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REGISTRY = [REQUESTS, REQUEST_SECONDS, REQUEST_SQL_SECONDS, REQUEST_SQL_QUERIES]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
+
+
+# --- SQL accounting ---
+
+class SQLTally:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_current_tally = contextvars.ContextVar('request_sql_tally', default=None)
+
+
+def sql_timer(execute, sql, params, many, context):
+    tally = _current_tally.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally.queries += 1
+        tally.seconds += time.perf_counter() - started
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    """connection_created receiver: every connection reports to the current request."""
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+# --- Middleware ---
+
+def route_name(request):
+    # Resolved url_name keeps the label set bounded (ids in paths never leak in)
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.url_name or match.view_name or 'unnamed'
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, SQL count and SQL time for a REQUEST_METRICS_SAMPLE_RATE
+    share of requests (1.0 = all, 0 = off). Unsampled requests only pay for
+    the coin flip.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        tally = SQLTally()
+        token, started = _current_tally.set(tally), time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_tally.reset(token)
+        self.record(request, response, time.perf_counter() - started, tally)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        tally = SQLTally()
+        token, started = _current_tally.set(tally), time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_tally.reset(token)
+        self.record(request, response, time.perf_counter() - started, tally)
+        return response
+
+    def record(self, request, response, seconds, tally):
+        route = route_name(request)
+        REQUESTS.inc(route, request.method, f'{response.status_code // 100}xx')
+        REQUEST_SECONDS.observe(seconds, route)
+        REQUEST_SQL_SECONDS.observe(tally.seconds, route)
+        REQUEST_SQL_QUERIES.observe(tally.queries, route)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:30
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Doctor = apps.get_model('doctor_search_app', 'Doctor')
+    for doctor in Doctor.objects.annotate(
+        total=Sum('reviews__rating'), count=Count('reviews'), avg=Avg('reviews__rating')
+    ).filter(count__gt=0):
+        Doctor.objects.filter(pk=doctor.pk).update(
+            rating_sum=doctor.total, review_count=doctor.count, average_rating=doctor.avg
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0002_saveddoctor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='average_rating',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 12:00
+
+from django.db import migrations
+
+from doctor_search_app.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0003_doctor_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['specialty', 'location'], name='doctor_sear_special_da413c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['name'], name='doctor_sear_name_2d3fff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['doctor', '-created_at'], name='doctor_sear_doctor__a4b184_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-created_at'], name='doctor_sear_user_id_03c90f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saveddoctor',
+            index=models.Index(fields=['user', '-created_at'], name='doctor_sear_user_id_41397a_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_no_duplicates(apps, schema_editor):
+    # Fail with the offending keys instead of a bare IntegrityError
+    Doctor = apps.get_model('doctor_search_app', 'Doctor')
+    duplicates = list(
+        Doctor.objects.using(schema_editor.connection.alias)
+        .values('name', 'hospital').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('name', 'hospital')[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Merge or rename doctors sharing a (name, hospital) before migrating: '
+            + '; '.join(f'{name} @ {hospital}' for name, hospital in duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0007_doctor_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_no_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='doctor',
+            constraint=models.UniqueConstraint(fields=('name', 'hospital'), name='unique_doctor_name_hospital'),
+        ),
+    ]
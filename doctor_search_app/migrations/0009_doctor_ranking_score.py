@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+
+
+def backfill_ranking_score(apps, schema_editor):
+    # Same formula as ratings.ranking_score_of(), against the current global mean
+    Doctor = apps.get_model('doctor_search_app', 'Doctor')
+    doctors = Doctor.objects.using(schema_editor.connection.alias)
+    totals = doctors.aggregate(rating_sum=Sum('rating_sum'), review_count=Sum('review_count'))
+    mean = getattr(settings, 'RANKING_PRIOR_MEAN', None)
+    if mean is None:
+        mean = totals['rating_sum'] / totals['review_count'] if totals['review_count'] else 5.5
+    weight = getattr(settings, 'RANKING_PRIOR_WEIGHT', 5)
+    doctors.update(ranking_score=(Cast(F('rating_sum'), FloatField()) + mean * weight) / (F('review_count') + weight))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0008_doctor_natural_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='ranking_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_ranking_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0009_doctor_ranking_score'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_created_at',
+        ),
+        migrations.CreateModel(
+            name='OTPChallenge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('verify_email', 'Verify email'), ('password_reset', 'Password reset')], max_length=20)),
+                ('code_hash', models.CharField(max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='otp_challenges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'purpose'), name='unique_otp_per_purpose')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:20
+
+from itertools import islice
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rating_buckets(apps, schema_editor):
+    # Same grouping as ratings.rebuild_rating_buckets()
+    Review = apps.get_model('doctor_search_app', 'Review')
+    DoctorRatingBucket = apps.get_model('doctor_search_app', 'DoctorRatingBucket')
+    alias = schema_editor.connection.alias
+    rows = (
+        Review.objects.using(alias)
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('doctor_id', 'month', 'rating')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    buckets = (DoctorRatingBucket(**row) for row in rows.iterator(chunk_size=5000))
+    while batch := list(islice(buckets, 5000)):
+        DoctorRatingBucket.objects.using(alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0010_otp_challenge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorRatingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('rating', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)])),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_buckets', to='doctor_search_app.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'month', 'rating'), name='unique_rating_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_rating_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:00
+
+from django.db import migrations
+
+from doctor_search_app.search import restore_search_triggers
+
+
+def restore_triggers(apps, schema_editor):
+    # 0008's AddConstraint rebuilt the doctor table on SQLite, dropping the FTS sync triggers
+    restore_search_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0011_doctor_rating_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:30
+
+from django.db import migrations
+
+
+def clear_bodies(apps, schema_editor):
+    # Mails already sent or given up on still hold their OTP codes in plain text
+    OutboxEmail = apps.get_model('doctor_search_app', 'OutboxEmail')
+    OutboxEmail.objects.using(schema_editor.connection.alias).filter(status__in=['sent', 'failed']).update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0012_restore_search_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_bodies, migrations.RunPython.noop),
+    ]
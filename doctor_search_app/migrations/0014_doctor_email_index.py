@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_search_app', '0013_clear_delivered_outbox_bodies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['email'], name='doctor_sear_email_220d1c_idx'),
+        ),
+    ]
@@ -1,11 +1,19 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models
+from django.db.models import F
+from django.db.models.constants import OnConflict
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-import random
 import datetime
+import hashlib
+import hmac
+import secrets
 
+from .geo import geohash
+
+# Largest id a BigAutoField holds; bigger ints overflow the database driver
+MAX_ID = 2 ** 63 - 1
 
 
 class User(AbstractUser):
@@ -15,23 +23,16 @@ class User(AbstractUser):
     admin = models.BooleanField(default=False)
     is_email_verified = models.BooleanField(default=False)
     recovery_pin = models.CharField(max_length=10, null=True, blank=True)
-    otp_code = models.CharField(max_length=6, null=True, blank=True)
-    otp_created_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.username
 
-    def generate_otp(self):
-        self.otp_code = f"{random.randint(100000, 999999)}"
-        self.otp_created_at = timezone.now()
-        self.save()
-        return self.otp_code
+    # OTPs live in OTPChallenge, so sending or checking a code never writes the user row
+    def generate_otp(self, purpose):
+        return OTPChallenge.issue(self, purpose)
 
-    def verify_otp(self, entered_otp):
-        if not self.otp_code or not self.otp_created_at: return False
-        if self.otp_code != entered_otp: return False
-        if timezone.now() > self.otp_created_at + datetime.timedelta(minutes=10): return False
-        return True
+    def verify_otp(self, entered_otp, purpose):
+        return OTPChallenge.verify(self, purpose, entered_otp)
 
 class Doctor(models.Model):
     name = models.CharField(max_length=255)
@@ -43,10 +44,47 @@ class Doctor(models.Model):
     
     # NEW FIELD FOR IMAGES
     image = models.URLField(max_length=500, null=True, blank=True)
+
+    # Stored rating aggregates (kept current by ratings.py, rebuilt by `rebuild_ratings`)
+    rating_sum = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
+    # Bayesian average against the global mean, so a lone 10/10 doesn't outrank 200 reviews at 9.6
+    ranking_score = models.FloatField(default=0, db_index=True)
+
+    # Practice coordinates and their geohash, the grid index for ?near= (see geo.py)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geo_cell = models.CharField(max_length=12, null=True, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['specialty', 'location']),  # filterset_fields
+            models.Index(fields=['name']),  # ?ordering=name pages
+            models.Index(fields=['email']),  # roster import matches renamed doctors by email
+        ]
+        constraints = [
+            # Natural key the roster importer upserts on
+            models.UniqueConstraint(fields=['name', 'hospital'], name='unique_doctor_name_hospital'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.specialty}"
 
+    def assign_geo_cell(self):
+        """Derive geo_cell from the coordinates. save() calls this; bulk writers must too."""
+        if self.latitude is None or self.longitude is None:
+            self.geo_cell = None
+        else:
+            self.geo_cell = geohash(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.assign_geo_cell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
 class Review(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -56,6 +94,40 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('doctor', 'user')
+        indexes = [
+            models.Index(fields=['doctor', '-created_at']),  # ?doctor_id= lists
+            models.Index(fields=['user', '-created_at']),  # ?mine=true lists
+        ]
+
+
+class DoctorRatingBucket(models.Model):
+    """
+    Number of a doctor's reviews with a given rating, per month the reviews
+    were written. Kept current by ratings.py alongside the stored aggregates;
+    /doctors/{id}/stats/ reads its histogram and trend from here.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='rating_buckets')
+    month = models.DateField()  # first day of the month
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'month', 'rating'], name='unique_rating_bucket'),
+        ]
+
+class RankingPrior(models.Model):
+    """
+    The global mean rating ranking_score is computed against, as a single row
+    (pk=1) written by ratings.refresh_ranking_scores. It lives here, not only
+    in the cache, so every worker scores against the same mean even when each
+    has its own locmem cache.
+    """
+    mean = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ranking prior mean {self.mean:.2f}"
 
 # Add this to your models.py
 
@@ -67,6 +139,142 @@ class SavedDoctor(models.Model):
     class Meta:
         unique_together = ('user', 'doctor') # Prevent saving the same doctor twice
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
 
     def __str__(self):
-        return f"{self.user.username} saved {self.doctor.name}"       
\ No newline at end of file
+        return f"{self.user.username} saved {self.doctor.name}"
+
+    @classmethod
+    def insert_if_doctor_exists(cls, user_id, doctor_id, using='default'):
+        """
+        Save a doctor in one statement: INSERT ... SELECT from the doctor table
+        (so an unknown id inserts nothing) ignoring a duplicate (user, doctor).
+        Returns True if a row was inserted.
+        """
+        connection = connections[using]
+        ops = connection.ops
+        fields = [cls._meta.get_field(name) for name in ('user', 'doctor', 'created_at')]
+        sql = (
+            f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(cls._meta.db_table)} "
+            f"({', '.join(ops.quote_name(field.column) for field in fields)}) "
+            f"SELECT %s, {ops.quote_name('id')}, %s FROM {ops.quote_name(Doctor._meta.db_table)} "
+            f"WHERE {ops.quote_name('id')} = %s "
+            f"{ops.on_conflict_suffix_sql(fields[:2], OnConflict.IGNORE, None, None)}"
+        )
+        now = ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, now, doctor_id])
+            return cursor.rowcount > 0
+
+    @classmethod
+    def delete_if_saved(cls, user_id, doctor_id, using='default'):
+        """
+        Unsave a doctor in one bare DELETE (QuerySet.delete() would wrap it in
+        BEGIN/COMMIT outside a transaction). Returns True if a row was deleted.
+        """
+        connection = connections[using]
+        ops = connection.ops
+        columns = [cls._meta.get_field(name).column for name in ('user', 'doctor')]
+        sql = (
+            f"DELETE FROM {ops.quote_name(cls._meta.db_table)} "
+            f"WHERE {ops.quote_name(columns[0])} = %s AND {ops.quote_name(columns[1])} = %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user_id, doctor_id])
+            return cursor.rowcount > 0
+
+class OutboxEmail(models.Model):
+    """
+    Mail queued by request threads and delivered by the `send_outbox` worker.
+    The body is blanked once the mail is sent or has failed for good.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+class OTPChallenge(models.Model):
+    """
+    One outstanding one-time code per (user, purpose). Only an HMAC of the
+    code is stored; a new code replaces the old one; a challenge dies after
+    OTP_TTL_SECONDS or OTP_MAX_ATTEMPTS wrong guesses. Expired rows are
+    removed by `purge_otp_challenges`.
+    """
+    VERIFY_EMAIL = 'verify_email'
+    PASSWORD_RESET = 'password_reset'
+    PURPOSE_CHOICES = [(VERIFY_EMAIL, 'Verify email'), (PASSWORD_RESET, 'Password reset')]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='otp_challenges')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    code_hash = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)  # purge scans
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'purpose'], name='unique_otp_per_purpose')]
+
+    def __str__(self):
+        return f"{self.purpose} code for user {self.user_id}"
+
+    @staticmethod
+    def lifetime():
+        return datetime.timedelta(seconds=settings.OTP_TTL_SECONDS)
+
+    @staticmethod
+    def hash_code(user_id, purpose, code):
+        message = f"{user_id}:{purpose}:{code}".encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    @classmethod
+    def issue(cls, user, purpose):
+        """Create or replace the user's challenge in one upsert. Returns the plain code."""
+        code = f"{secrets.randbelow(900000) + 100000}"
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [cls(
+                user=user, purpose=purpose, code_hash=cls.hash_code(user.pk, purpose, code), attempts=0,
+                created_at=now, expires_at=now + cls.lifetime(),
+            )],
+            update_conflicts=True,
+            unique_fields=['user', 'purpose'],
+            update_fields=['code_hash', 'attempts', 'created_at', 'expires_at'],
+        )
+        return code
+
+    @classmethod
+    def verify(cls, user, purpose, code):
+        """
+        Constant-time check of `code`. A match consumes the challenge; a miss
+        spends an attempt. Two statements either way.
+        """
+        challenge = cls.objects.filter(
+            user=user, purpose=purpose, expires_at__gt=timezone.now(), attempts__lt=settings.OTP_MAX_ATTEMPTS
+        ).only('id', 'code_hash').first()
+        if challenge is None:
+            return False
+        # The attempts guard makes concurrent guesses race for the remaining attempts, not past them
+        live = cls.objects.filter(pk=challenge.pk, attempts__lt=settings.OTP_MAX_ATTEMPTS)
+        if hmac.compare_digest(challenge.code_hash, cls.hash_code(user.pk, purpose, str(code))):
+            deleted, _ = live.delete()
+            return deleted == 1
+        live.update(attempts=F('attempts') + 1)
+        return False
@@ -0,0 +1,81 @@
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# Retry backoff: 30s, 1m, 2m, 4m, ... capped at an hour
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def enqueue_email(subject, body, recipients, from_email=None):
+    """Queue a mail for the worker. This is all a request thread should do."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        recipients=list(recipients),
+    )
+
+
+def _retry_delay(attempts):
+    return datetime.timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def deliver_pending(batch_size=50, max_attempts=5):
+    """
+    Send up to `batch_size` due mails over a single reused backend connection.
+    Failures are retried with exponential backoff until `max_attempts`, after
+    which the mail is marked failed. Returns (sent, failed) for this batch.
+
+    The body (it may carry a one-time code) is cleared once a mail is sent
+    or given up on; only the subject, recipients and status are kept.
+
+    Meant to be driven by one `send_outbox` worker at a time.
+    """
+    now = timezone.now()
+    batch = list(OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)[:batch_size])
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        connection_error = None
+    except Exception as e:
+        connection_error = e
+
+    try:
+        for mail in batch:
+            mail.attempts += 1
+            try:
+                if connection_error:
+                    raise connection_error
+                connection.send_messages([
+                    EmailMessage(mail.subject, mail.body, mail.from_email, mail.recipients, connection=connection)
+                ])
+            except Exception as e:
+                mail.last_error = str(e)
+                if mail.attempts >= max_attempts:
+                    mail.status = OutboxEmail.FAILED
+                    mail.body = ''
+                else:
+                    mail.next_attempt_at = now + _retry_delay(mail.attempts)
+                failed += 1
+            else:
+                mail.status = OutboxEmail.SENT
+                mail.sent_at = timezone.now()
+                mail.last_error = ''
+                mail.body = ''
+                sent += 1
+    finally:
+        if not connection_error:
+            connection.close()
+        OutboxEmail.objects.bulk_update(
+            batch, ['status', 'body', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+        )
+    return sent, failed
@@ -0,0 +1,180 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    # Keep full microsecond precision (DjangoJSONEncoder truncates to milliseconds)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the full ordering key instead of using OFFSET.
+
+    The ordering is taken from the queryset (so OrderingFilter keeps working) and
+    `id` is appended as a tiebreaker, e.g. `-average_rating` pages on
+    (average_rating, id). Every page is a single indexed range query, so page
+    500 costs the same as page 1. Ordering fields must be non-null.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    default_ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_query, cursor = self._page_query(queryset, request)
+        return self._set_page(list(page_query), cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: the page is read with the async ORM."""
+        page_query, cursor = self._page_query(queryset, request)
+        return self._set_page([row async for row in page_query], cursor)
+
+    def _page_query(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = self.decode_cursor(request)
+        ordering = [self._flip(term) for term in self.ordering] if cursor and cursor['r'] else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(self._seek(ordering, cursor['p']))
+            except (TypeError, ValueError, ValidationError):
+                # A hand-edited position the fields can't take (e.g. text for a float)
+                raise NotFound(self.invalid_cursor_message)
+
+        # Fetch one extra row to find out whether another page follows
+        return queryset[:self.page_size + 1], cursor
+
+    def _set_page(self, results, cursor):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if cursor and cursor['r']:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or self.default_ordering)
+        if not all(isinstance(term, str) for term in ordering):
+            raise ImproperlyConfigured('KeysetPagination only supports field name orderings.')
+
+        ordering = ['-id' if term == '-pk' else 'id' if term == 'pk' else term for term in ordering]
+        if not {'id', '-id'} & set(ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    # --- Cursor helpers ---
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'o': self.ordering,
+            'p': [_encode_value(self._value(row, term.lstrip('-'))) for term in self.ordering],
+            'r': int(reverse),
+        }
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            valid = (
+                payload['o'] == self.ordering
+                and len(payload['p']) == len(self.ordering)
+                # Ordering fields are non-null scalars
+                and all(isinstance(value, (str, int, float)) for value in payload['p'])
+                and payload['r'] in (0, 1)
+            )
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            valid = False
+        if not valid:
+            # Also covers cursors minted under a different ?ordering=
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
+    def _seek(self, ordering, position):
+        """Rows strictly after `position` in `ordering`, as a lexicographic OR of ANDs."""
+        condition = Q()
+        equal = {}
+        for term, value in zip(ordering, position):
+            field = term.lstrip('-')
+            lookup = 'lt' if term.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    @staticmethod
+    def _flip(term):
+        return term[1:] if term.startswith('-') else f'-{term}'
+
+    @staticmethod
+    def _value(row, field):
+        # Works for model instances and for .values() dicts
+        return row[field] if isinstance(row, dict) else getattr(row, field)
+
@@ -0,0 +1,9 @@
+from rest_framework import permissions
+
+
+class IsSiteAdmin(permissions.BasePermission):
+    """Users flagged `admin` (the frontend's admin role) or Django staff."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.admin or user.is_staff))
@@ -0,0 +1,231 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, TruncMonth
+from django.utils import timezone
+
+from .directory_cache import bump_directory_version
+from .models import Doctor, DoctorRatingBucket, RankingPrior, Review
+
+PRIOR_MEAN_KEY = 'ratings:prior-mean'
+# Seconds a worker may reuse the RankingPrior row before reading it again
+PRIOR_MEAN_CACHE_TIMEOUT = 60
+# Prior mean before there are any reviews: the middle of the 1-10 scale
+DEFAULT_PRIOR_MEAN = 5.5
+
+
+def average_of(sum_expr, count_expr):
+    """SQL expression for sum / count that yields 0 when there are no reviews."""
+    return Coalesce(
+        Cast(sum_expr, FloatField()) / NullIf(count_expr, 0),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def global_mean_rating():
+    """Mean of every review, read from the stored per-doctor sums."""
+    totals = Doctor.objects.aggregate(rating_sum=Sum('rating_sum'), review_count=Sum('review_count'))
+    if not totals['review_count']:
+        return DEFAULT_PRIOR_MEAN
+    return totals['rating_sum'] / totals['review_count']
+
+
+def ranking_prior(refresh=False):
+    """
+    (mean, weight) of the Bayesian prior: every doctor is ranked as if it had
+    `weight` extra reviews at `mean`. The mean is RANKING_PRIOR_MEAN if set,
+    otherwise the global mean stored in RankingPrior by the last full rebuild
+    (`refresh` recomputes and stores it). The row is cached for
+    PRIOR_MEAN_CACHE_TIMEOUT seconds, so after a rebuild workers with their
+    own caches agree again within that time.
+    """
+    weight = getattr(settings, 'RANKING_PRIOR_WEIGHT', 5)
+    mean = getattr(settings, 'RANKING_PRIOR_MEAN', None)
+    if mean is None:
+        if refresh:
+            mean = global_mean_rating()
+            RankingPrior.objects.update_or_create(pk=1, defaults={'mean': mean})
+        else:
+            mean = cache.get(PRIOR_MEAN_KEY)
+            if mean is None:
+                mean = RankingPrior.objects.filter(pk=1).values_list('mean', flat=True).first()
+            if mean is None:
+                # Another worker may store its own first; everyone uses the stored one
+                prior, _ = RankingPrior.objects.get_or_create(pk=1, defaults={'mean': global_mean_rating()})
+                mean = prior.mean
+        cache.set(PRIOR_MEAN_KEY, mean, PRIOR_MEAN_CACHE_TIMEOUT)
+    return mean, weight
+
+
+def ranking_score_of(sum_expr, count_expr, prior):
+    """SQL expression for the Bayesian average (sum + mean * weight) / (count + weight)."""
+    mean, weight = prior
+    return Coalesce(
+        (Cast(sum_expr, FloatField()) + mean * weight) / NullIf(count_expr + weight, 0),
+        Value(float(mean)),
+        output_field=FloatField(),
+    )
+
+
+def apply_rating_change(doctor_id, sum_delta, count_delta):
+    """Shift a doctor's stored aggregates by the given deltas in a single UPDATE."""
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('review_count') + count_delta
+    Doctor.objects.filter(pk=doctor_id).update(
+        rating_sum=new_sum,
+        review_count=new_count,
+        average_rating=average_of(new_sum, new_count),
+        ranking_score=ranking_score_of(new_sum, new_count, ranking_prior()),
+    )
+    bump_directory_version()
+
+
+def score_unreviewed(doctors=None):
+    """Give doctors without reviews the prior mean as their score (new rows default to 0)."""
+    doctors = Doctor.objects.all() if doctors is None else doctors
+    mean, _ = ranking_prior()
+    return doctors.filter(review_count=0).exclude(ranking_score=mean).update(ranking_score=mean)
+
+
+def review_month(created_at):
+    """The DoctorRatingBucket month of a review (same as TruncMonth in the current time zone)."""
+    return timezone.localdate(created_at).replace(day=1)
+
+
+def shift_rating_bucket(doctor_id, rating, created_at, delta):
+    """Add `delta` to the count of the doctor's (month, rating) bucket, creating it if needed."""
+    key = {'doctor_id': doctor_id, 'month': review_month(created_at), 'rating': rating}
+    buckets = DoctorRatingBucket.objects.filter(**key)
+    if delta < 0:
+        buckets.filter(count__gte=-delta).update(count=F('count') + delta)
+    elif not buckets.update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                DoctorRatingBucket.objects.create(**key, count=delta)
+        except IntegrityError:
+            # A concurrent review created it first
+            buckets.update(count=F('count') + delta)
+
+
+def review_added(doctor_id, rating, created_at):
+    apply_rating_change(doctor_id, rating, 1)
+    shift_rating_bucket(doctor_id, rating, created_at, 1)
+
+
+def review_removed(doctor_id, rating, created_at):
+    apply_rating_change(doctor_id, -rating, -1)
+    shift_rating_bucket(doctor_id, rating, created_at, -1)
+
+
+def rebuild_rating_aggregates(doctor_ids=None):
+    """Recompute the stored aggregates from the review table. Returns rows updated."""
+    reviews = Review.objects.filter(doctor=OuterRef('pk')).order_by().values('doctor')
+    rating_sum = Coalesce(
+        Subquery(reviews.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()),
+        Value(0),
+    )
+    review_count = Coalesce(
+        Subquery(reviews.annotate(total=Count('pk')).values('total'), output_field=IntegerField()),
+        Value(0),
+    )
+
+    doctors = Doctor.objects.all()
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+
+    # Two passes: the average is derived from the freshly stored columns.
+    doctors.update(rating_sum=rating_sum, review_count=review_count)
+    updated = doctors.update(average_rating=average_of(F('rating_sum'), F('review_count')))
+    if doctor_ids is None:
+        refresh_ranking_scores()
+    else:
+        doctors.update(ranking_score=ranking_score_of(F('rating_sum'), F('review_count'), ranking_prior()))
+    rebuild_rating_buckets(doctor_ids)
+    # Also after bulk doctor inserts (seeds, synthetic data), which send no signals
+    bump_directory_version(roster=True)
+    return updated
+
+
+def rebuild_rating_buckets(doctor_ids=None, batch_size=5000):
+    """Replace the doctors' DoctorRatingBucket rows with counts taken from the review table."""
+    buckets = DoctorRatingBucket.objects.all()
+    reviews = Review.objects.all()
+    if doctor_ids is not None:
+        buckets = buckets.filter(doctor_id__in=doctor_ids)
+        reviews = reviews.filter(doctor_id__in=doctor_ids)
+    buckets.delete()
+
+    rows = (
+        reviews.annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('doctor_id', 'month', 'rating')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    new_buckets = (DoctorRatingBucket(**row) for row in rows.iterator(chunk_size=batch_size))
+    while batch := list(islice(new_buckets, batch_size)):
+        DoctorRatingBucket.objects.bulk_create(batch)
+
+
+def refresh_ranking_scores():
+    """
+    Recompute the global prior mean and every doctor's score against it.
+    Incremental updates reuse the stored prior, so this is what realigns
+    scores as the global mean drifts (run via `rebuild_ratings`).
+    """
+    prior = ranking_prior(refresh=True)
+    updated = Doctor.objects.update(ranking_score=ranking_score_of(F('rating_sum'), F('review_count'), prior))
+    bump_directory_version(roster=True)
+    return updated
+
+
+# --- Per-doctor statistics (/doctors/{id}/stats/) ---
+
+# The trend lists the last TREND_MONTHS months (including the current one) and
+# compares the mean of the latest TREND_WINDOW of them with the TREND_WINDOW before
+TREND_MONTHS = 6
+TREND_WINDOW = 3
+
+
+def _add_months(month, offset):
+    index = month.year * 12 + month.month - 1 + offset
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def rating_stats(doctor, today=None):
+    """Rating histogram, count, mean and monthly trend of a doctor, read from DoctorRatingBucket."""
+    this_month = (today or timezone.localdate()).replace(day=1)
+    histogram = dict.fromkeys(range(1, 11), 0)
+    monthly = {}  # month -> (review count, rating sum)
+    buckets = DoctorRatingBucket.objects.filter(doctor=doctor, count__gt=0).values_list('month', 'rating', 'count')
+    for month, rating, count in buckets:
+        histogram[rating] += count
+        reviews, total = monthly.get(month, (0, 0))
+        monthly[month] = (reviews + count, total + rating * count)
+
+    def mean_of(months):
+        reviews = sum(monthly.get(month, (0, 0))[0] for month in months)
+        total = sum(monthly.get(month, (0, 0))[1] for month in months)
+        return total / reviews if reviews else None
+
+    months = [_add_months(this_month, offset) for offset in range(1 - TREND_MONTHS, 1)]
+    recent_mean = mean_of(months[-TREND_WINDOW:])
+    previous_mean = mean_of(months[-2 * TREND_WINDOW:-TREND_WINDOW])
+    return {
+        'doctor_id': doctor.pk,
+        'count': doctor.review_count,
+        'mean': doctor.average_rating,
+        'histogram': [{'rating': rating, 'count': count} for rating, count in histogram.items()],
+        'trend': {
+            'months': [
+                {'month': month, 'count': monthly.get(month, (0, 0))[0], 'mean': mean_of([month])}
+                for month in months
+            ],
+            'recent_mean': recent_mean,
+            'previous_mean': previous_mean,
+            'change': recent_mean - previous_mean if recent_mean is not None and previous_mean is not None else None,
+        },
+    }
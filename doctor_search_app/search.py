@@ -0,0 +1,189 @@
+import re
+
+from django.db import connections, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .geo import CELL_END, covering_cells, distance_km_expression
+
+DOCTOR_TABLE = 'doctor_search_app_doctor'
+FTS_TABLE = 'doctor_search_app_doctor_fts'
+
+# Indexed columns and their bm25 weights (a hit on the name counts most)
+SEARCH_COLUMNS = ('name', 'specialty', 'hospital', 'location')
+COLUMN_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+# External-content FTS5 table kept in sync by triggers, so every write path
+# (ORM save, bulk_create, admin, raw SQL) updates the index.
+# SQLite drops the triggers whenever a migration rebuilds the doctor table
+# (AddConstraint, AlterField, ...): such migrations must call restore_search_triggers().
+TRIGGER_NAMES = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+
+CREATE_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCTOR_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCTOR_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON {DOCTOR_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+DROP_TRIGGERS_SQL = [f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGER_NAMES]
+
+REBUILD_INDEX_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+CREATE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {_columns},
+        content='{DOCTOR_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    *CREATE_TRIGGERS_SQL,
+    REBUILD_INDEX_SQL,
+]
+
+DROP_INDEX_SQL = [*DROP_TRIGGERS_SQL, f'DROP TABLE IF EXISTS {FTS_TABLE}']
+
+
+def create_search_index(connection):
+    """Create the FTS5 index. Returns False when the backend can't provide one."""
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for statement in CREATE_INDEX_SQL:
+                cursor.execute(statement)
+    except Exception:
+        # SQLite built without FTS5: searches fall back to icontains
+        return False
+    return True
+
+
+def drop_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_INDEX_SQL:
+            cursor.execute(statement)
+
+
+def restore_search_triggers(connection):
+    """
+    Reinstall the sync triggers and re-index every doctor. For migrations that
+    rebuilt the doctor table, which silently drops its triggers.
+    """
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for statement in [*DROP_TRIGGERS_SQL, *CREATE_TRIGGERS_SQL, REBUILD_INDEX_SQL]:
+            cursor.execute(statement)
+
+
+def search_index_available(connection):
+    """True when the FTS table and all of its sync triggers exist; otherwise search uses icontains."""
+    if getattr(connection, '_doctor_fts_available', False):
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master "
+            "WHERE (type = 'table' AND name = %s) OR (type = 'trigger' AND name IN (%s, %s, %s))",
+            [FTS_TABLE, *TRIGGER_NAMES],
+        )
+        available = cursor.fetchone()[0] == 1 + len(TRIGGER_NAMES)
+    # Only remember positives: the index may be created after the first check (e.g. migrate)
+    if available:
+        connection._doctor_fts_available = True
+    return available
+
+
+def build_match_query(term):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match,
+    and each word is a prefix so partial input ("card nai") already hits.
+    """
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class DoctorSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the SQLite FTS5 index on Doctor.
+
+    Matches are ranked by bm25 across the indexed columns (annotated as
+    `search_rank`, lower is better) unless ?ordering= is given. Falls back to
+    the stock icontains search when the index isn't available.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        match = build_match_query(term)
+        if match is None or not search_index_available(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {DOCTOR_TABLE}.id',
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('search_rank', '-average_rating')
+
+
+class NearFilter(filters.BaseFilterBackend):
+    """
+    ?near=lat,lng&radius_km= -> doctors within the radius, nearest first,
+    annotated with `distance_km`. Doctors without coordinates never match.
+
+    The geohash cells covering the circle are range scans on the geo_cell
+    index; the distance is only computed for the rows inside them.
+    """
+    near_param = 'near'
+    radius_param = 'radius_km'
+    default_radius_km = 10.0
+    max_radius_km = 500.0
+
+    def parse(self, params):
+        try:
+            lat, lng = (float(value) for value in params[self.near_param].split(','))
+        except ValueError:
+            raise ValidationError({self.near_param: 'Expected "latitude,longitude".'})
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({self.near_param: 'Coordinates out of range.'})
+        try:
+            radius = float(params.get(self.radius_param, self.default_radius_km))
+        except ValueError:
+            raise ValidationError({self.radius_param: 'Expected a number of kilometres.'})
+        if not 0 < radius <= self.max_radius_km:
+            raise ValidationError({self.radius_param: f'Must be between 0 and {self.max_radius_km:g}.'})
+        return lat, lng, radius
+
+    def filter_queryset(self, request, queryset, view):
+        if not request.query_params.get(self.near_param):
+            return queryset
+        lat, lng, radius = self.parse(request.query_params)
+
+        in_cells = Q()
+        for cell in covering_cells(lat, lng, radius):
+            in_cells |= Q(geo_cell__gte=cell, geo_cell__lt=cell + CELL_END)
+        return (
+            queryset.filter(in_cells)
+            .annotate(distance_km=distance_km_expression(lat, lng))
+            .filter(distance_km__lte=radius)
+            .order_by('distance_km')
+        )
@@ -1,8 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Doctor, Review
-from .models import SavedDoctor
-from django.db.models import Avg  # <--- ADD THIS IMPORT
+from .models import MAX_ID, SavedDoctor
 User = get_user_model()
 
 # ===========================
@@ -55,34 +54,43 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'doctor', 'doctor_name', 'user', 'rating', 'comment', 'created_at']
 
+class ReviewListSerializer(serializers.Serializer):
+    """Same shape as ReviewSerializer, but reads plain .values() rows for list pages."""
+    id = serializers.IntegerField()
+    doctor = serializers.IntegerField(source='doctor_id')
+    doctor_name = serializers.CharField(source='doctor__name')
+    user = serializers.CharField(source='user__username')
+    rating = serializers.IntegerField()
+    comment = serializers.CharField(allow_null=True)
+    created_at = serializers.DateTimeField()
+
+    # Columns to pass to .values() for this serializer
+    value_fields = ['id', 'doctor_id', 'doctor__name', 'user__username', 'rating', 'comment', 'created_at']
+
 class DoctorSerializer(serializers.ModelSerializer):
-    # Use SerializerMethodField to ensure we always get a value
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    # Skipped from the output unless the queryset annotated it (authenticated doctor lists)
+    is_saved = serializers.BooleanField(read_only=True)
+    # Likewise only present on ?near= lists
+    distance_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Doctor
         fields = [
             'id', 'name', 'specialty', 'hospital', 'location', 
-            'average_rating', 'review_count', 'email', 'cell', 'image'
+            'average_rating', 'review_count', 'ranking_score', 'email', 'cell', 'image',
+            'latitude', 'longitude', 'is_saved', 'distance_km'
         ]
+        # Maintained from the review table, never written by clients
+        read_only_fields = ['average_rating', 'review_count', 'ranking_score']
+class DoctorImportSerializer(serializers.ModelSerializer):
+    """Validates one roster row for importer.py."""
+
+    class Meta:
+        model = Doctor
+        fields = ['name', 'specialty', 'hospital', 'location', 'email', 'cell', 'image', 'latitude', 'longitude']
+        # Matching on (name, hospital) is an upsert, not a uniqueness error (and saves a query per row)
+        validators = []
 
-    def get_average_rating(self, obj):
-        # 1. Check if it was pre-calculated (Annotated in QuerySet)
-        if hasattr(obj, 'average_rating') and obj.average_rating is not None:
-            return obj.average_rating
-        
-        # 2. Fallback: Calculate it on the fly (For Saved Doctors list)
-        avg = obj.reviews.aggregate(Avg('rating'))['rating__avg']
-        return avg if avg else 0
-
-    def get_review_count(self, obj):
-        # 1. Check if pre-calculated
-        if hasattr(obj, 'review_count'):
-            return obj.review_count
-        
-        # 2. Fallback: Count manually
-        return obj.reviews.count()
 # Add this to serializers.py
 
 
@@ -93,4 +101,18 @@ class SavedDoctorSerializer(serializers.ModelSerializer):
     class Meta:
         model = SavedDoctor
         fields = ['id', 'doctor', 'doctor_details', 'created_at']
-        read_only_fields = ['user']        
\ No newline at end of file
+        read_only_fields = ['user']
+
+class SavedDoctorBulkSerializer(serializers.Serializer):
+    # Ids past the BigAutoField range would overflow the driver: reject them as invalid
+    save = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_ID), required=False, default=list, max_length=500,
+    )
+    unsave = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_ID), required=False, default=list, max_length=500,
+    )
+
+    def validate(self, data):
+        if set(data['save']) & set(data['unsave']):
+            raise serializers.ValidationError("A doctor can't be both saved and unsaved in one request.")
+        return data        
\ No newline at end of file
@@ -0,0 +1,31 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import ratings
+from .directory_cache import bump_directory_version
+from .authentication import forget_user
+from .metrics import install_sql_timer
+from .models import Doctor, User
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, **kwargs):
+    # Review writes bump through ratings.apply_rating_change
+    bump_directory_version(roster=True)
+
+
+@receiver(post_save, sender=Doctor)
+def score_new_doctor(sender, instance, created, **kwargs):
+    if created:
+        ratings.score_unreviewed(Doctor.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Drop the cached copy CachedJWTAuthentication would otherwise keep serving
+    forget_user(instance.pk)
+
+
+# Per-request SQL counts and timings for /api/metrics/
+connection_created.connect(install_sql_timer, dispatch_uid='doctor_search_sql_timer')
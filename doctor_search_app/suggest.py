@@ -0,0 +1,118 @@
+"""
+Typeahead suggestions for the search box, served from memory.
+
+Each worker keeps sorted prefix indexes of doctor names, specialties,
+hospitals and locations. A lookup is a bisect into a sorted list of keys,
+so it does no SQL. Every word of a value is a key ("Dr Jane Smith" is
+found by "jan" and by "smi"), and matches come back best first: doctors by
+ranking_score, the other fields by how many doctors have that value.
+
+The indexes are tagged with the roster version (directory_cache), which
+only doctor writes bump, and the next lookup after one rebuilds them with
+one query. Review writes don't: doctor order may trail ranking_score by up
+to SUGGEST_INDEX_MAX_AGE seconds. While one thread rebuilds, the others
+keep answering from the previous index.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+from .directory_cache import get_roster_version
+from .models import Doctor
+
+GROUPS = ('doctors', 'specialties', 'hospitals', 'locations')
+# Keys looked at per lookup: caps the cost of one- or two-letter prefixes,
+# at the price of ranking only the alphabetically first matches for those
+MAX_SCAN = 1000
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall(text.casefold()))
+
+
+class PrefixIndex:
+    """
+    `items` must be ordered best first. Every word-suffix of an item's text
+    ("jane smith", "smith") is a key pointing at the item's position, so the
+    smallest positions found under a prefix are the best matches.
+    """
+
+    def __init__(self, items, text_of):
+        self.items = items
+        pairs = []
+        for position, item in enumerate(items):
+            words = normalize(text_of(item)).split(' ')
+            pairs += {(' '.join(words[i:]), position) for i in range(len(words))}
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def search(self, prefix, limit):
+        start = bisect_left(self.keys, prefix)
+        found = set()
+        for i in range(start, min(start + MAX_SCAN, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            found.add(self.positions[i])
+        return [self.items[position] for position in sorted(found)[:limit]]
+
+
+class SuggestIndex:
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        rows = list(Doctor.objects.values_list('id', 'name', 'specialty', 'hospital', 'location', 'ranking_score'))
+
+        doctors = sorted(rows, key=lambda row: (-row[5], row[1], row[0]))
+        self.indexes = {'doctors': PrefixIndex([{'id': row[0], 'name': row[1]} for row in doctors], lambda d: d['name'])}
+        for group, column in (('specialties', 2), ('hospitals', 3), ('locations', 4)):
+            counts = Counter(row[column] for row in rows if row[column])
+            values = [{'value': value, 'count': count} for value, count in counts.items()]
+            values.sort(key=lambda v: (-v['count'], v['value']))
+            self.indexes[group] = PrefixIndex(values, lambda v: v['value'])
+
+    def suggest(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return {group: [] for group in GROUPS}
+        return {group: self.indexes[group].search(prefix, limit) for group in GROUPS}
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _is_current(index, version):
+    max_age = getattr(settings, 'SUGGEST_INDEX_MAX_AGE', 300)
+    return index is not None and index.version == version and time.monotonic() - index.built_at < max_age
+
+
+def get_index():
+    """This worker's index, rebuilt first if doctors changed or it has aged out."""
+    global _index
+    version = get_roster_version()
+    index = _index
+    if _is_current(index, version):
+        return index
+    if index is not None and not _build_lock.acquire(blocking=False):
+        # Another thread is rebuilding: a slightly stale answer beats waiting
+        return index
+    if index is None:
+        _build_lock.acquire()
+    try:
+        # Another thread may have rebuilt it while we waited
+        if not _is_current(_index, version):
+            _index = SuggestIndex(version)
+        return _index
+    finally:
+        _build_lock.release()
+
+
+def suggest(query, limit=5):
+    return get_index().suggest(query, limit)
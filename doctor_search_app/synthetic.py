@@ -0,0 +1,198 @@
+"""
+Synthetic data generation for load tests and benchmarks.
+
+Everything is written with batched bulk_create calls, so datasets in the
+millions of reviews take seconds rather than minutes.
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Doctor, Review, SavedDoctor
+from .ratings import rebuild_rating_aggregates
+
+User = get_user_model()
+
+# REVIEW COMMENTS BANK
+GOOD_REVIEWS = [
+    "Excellent service, very professional.",
+    "Saved my life! Best doctor in the region.",
+    "Very kind and took time to explain everything.",
+    "Great facility and friendly staff.",
+    "Highly recommended for anyone with similar issues.",
+    "The treatment worked wonders. Thank you daktari.",
+    "Very knowledgeable and precise.",
+    "Wait time was short and the service was top notch."
+]
+
+AVG_REVIEWS = [
+    "Good doctor but the queue was too long.",
+    "Service was okay, but the receptionist was rude.",
+    "Decent experience, but a bit expensive.",
+    "Treatment was effective but follow-up was slow.",
+    "Average experience. Nothing special."
+]
+
+BAD_REVIEWS = [
+    "Kept me waiting for 3 hours!",
+    "Did not listen to my concerns at all.",
+    "Very expensive for the level of service provided.",
+    "Rushed through the consultation.",
+    "I would not recommend this clinic.",
+    "Very unprofessional staff."
+]
+
+SPECIALTIES = [
+    "Cardiologist", "Physician", "Diabetologist", "Gastroenterologist", "Neurologist",
+    "Dentist", "Obs/Gyn", "Paediatrician", "ENT Surgeon", "Dermatologist",
+    "Orthopaedic Surgeon", "Psychiatrist", "Ophthalmologist", "Oncologist", "Urologist",
+]
+
+LOCATIONS = [
+    "Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Malindi",
+    "Kitale", "Garissa", "Kakamega", "Nyeri", "Machakos", "Meru", "Kericho",
+]
+
+FIRST_NAMES = [
+    "Wanjiku", "Otieno", "Kamau", "Achieng", "Odhiambo", "Nyambura", "Ochieng",
+    "Njoroge", "Mwangi", "Chebet", "Kipkorir", "Adhiambo", "Wambui", "Maina",
+    "Kariuki", "Mutua", "Omondi", "Anyango", "Juma", "Njeri",
+]
+
+LAST_NAMES = [
+    "Muratha", "Kisyoka", "Nyamu", "Okumu", "Chakava", "Ngugi", "Goke", "Muraguri",
+    "Kairu", "Amayo", "Mutara", "Marani", "Obwaka", "Cheserem", "Kinuthia", "Okello",
+]
+
+# City centre (latitude, longitude) for every location above
+CITY_COORDINATES = {
+    "Nairobi": (-1.2864, 36.8172), "Mombasa": (-4.0435, 39.6682), "Kisumu": (-0.0917, 34.7680),
+    "Nakuru": (-0.3031, 36.0800), "Eldoret": (0.5143, 35.2698), "Thika": (-1.0333, 37.0693),
+    "Malindi": (-3.2192, 40.1169), "Kitale": (1.0157, 35.0062), "Garissa": (-0.4532, 39.6461),
+    "Kakamega": (0.2827, 34.7519), "Nyeri": (-0.4201, 36.9476), "Machakos": (-1.5177, 37.2634),
+    "Meru": (0.0470, 37.6498), "Kericho": (-0.3689, 35.2863),
+}
+
+HOSPITAL_SUFFIXES = ["Hospital", "Medical Centre", "Clinic", "Medicare Plaza", "Health Centre"]
+
+
+def random_review(rng):
+    """A (rating, comment) pair: 70% good, 20% average, 10% bad."""
+    rand_val = rng.random()
+    if rand_val < 0.7:
+        return rng.randint(8, 10), rng.choice(GOOD_REVIEWS)
+    if rand_val < 0.9:
+        return rng.randint(5, 7), rng.choice(AVG_REVIEWS)
+    return rng.randint(1, 4), rng.choice(BAD_REVIEWS)
+
+
+def coordinates_near(rng, location, spread=0.08):
+    """A point within roughly `spread` degrees (~9km) of the city centre, or (None, None)."""
+    if location not in CITY_COORDINATES:
+        return None, None
+    lat, lng = CITY_COORDINATES[location]
+    return round(lat + rng.uniform(-spread, spread), 6), round(lng + rng.uniform(-spread, spread), 6)
+
+
+def bulk_insert(objects, model, batch_size=5000):
+    """bulk_create an iterable in fixed-size batches so memory stays bounded."""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+
+
+def in_chunks(items, size=500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def create_users(usernames, batch_size=5000):
+    """
+    Make sure a user exists for every username (password `password123`) and
+    return their ids in the same order. Existing users are left untouched.
+    """
+    # Hashing is the slow part of creating users: do it once and share it
+    password = make_password('password123')
+    bulk_insert((
+        User(username=username, email=f'{username}@example.com', password=password)
+        for username in usernames
+    ), User, batch_size)
+
+    ids = {}
+    for chunk in in_chunks(usernames):
+        ids.update(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+    return [ids[username] for username in usernames]
+
+
+def synthetic_doctors(rng, count, start=0, tag='synthetic'):
+    """Unsaved Doctor rows numbered start..start+count-1, identifiable by email."""
+    for i in range(start, start + count):
+        location = rng.choice(LOCATIONS)
+        latitude, longitude = coordinates_near(rng, location)
+        doctor = Doctor(
+            name=f"Dr {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+            specialty=rng.choice(SPECIALTIES),
+            hospital=f"{location} {rng.choice(HOSPITAL_SUFFIXES)}",
+            location=location,
+            email=f"{tag}-{i}@example.com",
+            cell=f"07{rng.randint(10000000, 99999999)}",
+            latitude=latitude,
+            longitude=longitude,
+        )
+        # bulk_create skips save()
+        doctor.assign_geo_cell()
+        yield doctor
+
+
+def create_reviews(rng, doctor_ids, user_ids, per_doctor, batch_size=5000):
+    """
+    Write `per_doctor` reviews for every doctor, each from a different user.
+    `per_doctor` may be an int or a (low, high) range.
+    """
+    def reviews():
+        for doctor_id in doctor_ids:
+            count = rng.randint(*per_doctor) if isinstance(per_doctor, tuple) else per_doctor
+            for user_id in rng.sample(user_ids, min(count, len(user_ids))):
+                rating, comment = random_review(rng)
+                yield Review(doctor_id=doctor_id, user_id=user_id, rating=rating, comment=comment)
+
+    bulk_insert(reviews(), Review, batch_size)
+
+
+def generate_dataset(doctors=1000, users=100, reviews_per_doctor=10, saved_per_user=10, seed=0, batch_size=5000):
+    """
+    Write a synthetic directory: `users` reviewers, `doctors` doctors with
+    `reviews_per_doctor` reviews each (capped at `users`, one review per user
+    per doctor) and `saved_per_user` saved doctors per user.
+
+    The same seed always produces the same dataset. Returns the new user and
+    doctor ids.
+    """
+    rng = random.Random(seed)
+    tag = f'synthetic_{seed}'
+
+    with transaction.atomic():
+        user_ids = create_users([f'{tag}_{i}' for i in range(users)], batch_size)
+
+        last_doctor_id = Doctor.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        bulk_insert(synthetic_doctors(rng, doctors, tag=tag), Doctor, batch_size)
+        new_doctors = Doctor.objects.filter(id__gt=last_doctor_id)
+        doctor_ids = list(new_doctors.order_by('id').values_list('id', flat=True))
+
+        create_reviews(rng, doctor_ids, user_ids, reviews_per_doctor, batch_size)
+        bulk_insert((
+            SavedDoctor(user_id=user_id, doctor_id=doctor_id)
+            for user_id in user_ids
+            for doctor_id in rng.sample(doctor_ids, min(saved_per_user, len(doctor_ids)))
+        ), SavedDoctor, batch_size)
+
+        rebuild_rating_aggregates(new_doctors.values('id'))
+
+    return user_ids, doctor_ids
@@ -1,3 +1,1057 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import time
+from datetime import UTC, date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import benchmarks, geo, metrics, ratings, search, suggest
+from .authentication import CachedJWTAuthentication
+from .hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from .importer import import_doctors, read_json
+from .models import Doctor, DoctorRatingBucket, OTPChallenge, OutboxEmail, RankingPrior, Review, SavedDoctor, User
+from .outbox import deliver_pending
+from .synthetic import generate_dataset
+from .throttling import AuthIPThrottle
+
+
+def make_doctor(**kwargs):
+    defaults = {
+        'name': 'Dr Test', 'specialty': 'Cardiologist', 'hospital': 'Nairobi Hospital',
+        'location': 'Nairobi', 'email': 'dr@example.com', 'cell': '0700000000',
+    }
+    defaults.update(kwargs)
+    return Doctor.objects.create(**defaults)
+
+
+class SavedDoctorListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('patient', 'patient@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def save_doctors(self, count):
+        reviewer = User.objects.create_user(f'reviewer{count}', f'reviewer{count}@example.com', 'pw')
+        for i in range(count):
+            doctor = make_doctor(name=f'Dr {count}-{i}', rating_sum=8, review_count=1, average_rating=8.0)
+            Review.objects.create(doctor=doctor, user=reviewer, rating=8)
+            SavedDoctor.objects.create(user=self.user, doctor=doctor)
+
+    def test_query_count_does_not_grow_with_list_length(self):
+        self.save_doctors(2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/saved-doctors/')
+        self.assertEqual(len(response.data), 2)
+
+        self.save_doctors(25)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/saved-doctors/')
+        self.assertEqual(len(response.data), 27)
+
+    def test_nested_doctor_carries_rating_aggregates(self):
+        self.save_doctors(1)
+        details = self.client.get('/api/saved-doctors/').data[0]['doctor_details']
+        self.assertEqual(details['average_rating'], 8.0)
+        self.assertEqual(details['review_count'], 1)
+
+
+class ApiBenchmarkTests(TestCase):
+    """Query-count half of `manage.py benchmark_api`, run on every test pass."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.baseline = benchmarks.load_baseline()
+        user_ids, _ = generate_dataset(**cls.baseline['dataset'])
+        cls.user = User.objects.get(pk=user_ids[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_counts_within_baseline(self):
+        results = benchmarks.run_benchmarks(self.user, iterations=2, warmup=0)
+        self.assertEqual(benchmarks.compare_to_baseline(results, self.baseline), [])
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def register(self):
+        return APIClient().post('/api/auth/register/', {
+            'username': 'newpatient', 'email': 'new@example.com', 'password': 'S3cure-pass!'
+        }, format='json')
+
+    def test_register_only_enqueues(self):
+        self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.recipients, ['new@example.com'])
+        self.assertEqual(queued.status, OutboxEmail.PENDING)
+
+    def test_worker_delivers_batch(self):
+        self.register()
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Verification Code', mail.outbox[0].subject)
+        self.assertIn('Your OTP code is', mail.outbox[0].body)
+        delivered = OutboxEmail.objects.get()
+        self.assertEqual((delivered.status, delivered.body), (OutboxEmail.SENT, ''))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_failed_delivery_is_retried_then_given_up(self):
+        self.register()
+        with override_settings(EMAIL_BACKEND='doctor_search_app.tests.FailingEmailBackend'):
+            self.assertEqual(deliver_pending(max_attempts=2), (0, 1))
+            queued = OutboxEmail.objects.get()
+            self.assertEqual((queued.status, queued.attempts), (OutboxEmail.PENDING, 1))
+            self.assertIn('SMTP unavailable', queued.last_error)
+
+            # Not due yet because of the backoff
+            self.assertEqual(deliver_pending(max_attempts=2), (0, 0))
+            OutboxEmail.objects.update(next_attempt_at=queued.created_at)
+            deliver_pending(max_attempts=2)
+        given_up = OutboxEmail.objects.get()
+        self.assertEqual((given_up.status, given_up.body), (OutboxEmail.FAILED, ''))
+
+
+class DirectoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor()
+        self.client = APIClient()
+
+    def test_anonymous_list_is_served_from_cache(self):
+        first = self.client.get('/api/doctors/?ordering=name')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/doctors/?ordering=name')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/doctors/')['ETag']
+        response = self.client.get('/api/doctors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_review_write_invalidates(self):
+        etag = self.client.get('/api/doctors/')['ETag']
+        user = User.objects.create_user('reviewer', 'reviewer@example.com', 'pw')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/reviews/', {'doctor': self.doctor.id, 'rating': 9}, format='json')
+        self.client.force_authenticate(None)
+
+        response = self.client.get('/api/doctors/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['average_rating'], 9.0)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest._index = None
+        make_doctor(name='Dr Jane Carter', specialty='Cardiologist', hospital='Aga Khan', email='a@example.com',
+                    review_count=3, ranking_score=9.0)
+        make_doctor(name='Dr Carl Otieno', specialty='Cardiologist', hospital='Karen Hospital', email='b@example.com')
+        make_doctor(name='Dr Amina Kariuki', specialty='Dentist', hospital='Nairobi Hospital', email='c@example.com',
+                    location='Karatina')
+
+    def suggest(self, q, **params):
+        response = APIClient().get('/api/doctors/suggest/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_matches_word_prefixes_best_first(self):
+        data = self.suggest('car')
+        self.assertEqual([d['name'] for d in data['doctors']], ['Dr Jane Carter', 'Dr Carl Otieno'])
+        self.assertEqual(data['specialties'], [{'value': 'Cardiologist', 'count': 2}])
+        self.assertEqual(data['hospitals'], [])
+        self.assertEqual([h['value'] for h in self.suggest('kar')['hospitals']], ['Karen Hospital'])
+        self.assertEqual(self.suggest('HOSP', limit=1)['hospitals'], [{'value': 'Karen Hospital', 'count': 1}])
+
+    def test_lookups_do_no_sql_until_the_directory_changes(self):
+        self.suggest('dr')
+        with self.assertNumQueries(0):
+            self.assertEqual([l['value'] for l in self.suggest('kara')['locations']], ['Karatina'])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_doctor(name='Dr Karanja', email='d@example.com')
+        self.assertEqual([d['name'] for d in self.suggest('kara')['doctors']], ['Dr Karanja'])
+
+    def test_review_writes_keep_the_index(self):
+        self.suggest('dr')
+        doctor = Doctor.objects.get(name='Dr Carl Otieno')
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='reviewer', email='r@example.com'))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/reviews/', {'doctor': doctor.id, 'rating': 10})
+        index = suggest._index
+        with self.assertNumQueries(0):
+            self.suggest('car')
+        self.assertIs(suggest._index, index)
+        # ...until it ages out
+        with override_settings(SUGGEST_INDEX_MAX_AGE=0), self.assertNumQueries(1):
+            self.suggest('car')
+        self.assertIsNot(suggest._index, index)
+
+    def test_blank_query_and_bad_limit(self):
+        self.assertEqual(self.suggest('  '), {'doctors': [], 'specialties': [], 'hospitals': [], 'locations': []})
+        self.assertEqual(APIClient().get('/api/doctors/suggest/?q=a&limit=x').status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # The positive check is remembered per connection
+        if hasattr(connection, '_doctor_fts_available'):
+            del connection._doctor_fts_available
+
+    def search(self, term):
+        return [row['name'] for row in APIClient().get('/api/doctors/', {'search': term}).data['results']]
+
+    def test_doctors_written_after_migrations_are_indexed(self):
+        self.assertTrue(search.search_index_available(connection))
+        make_doctor(name='Dr Wanjiru Kariuki')
+        self.assertEqual(self.search('Kariuki'), ['Dr Wanjiru Kariuki'])
+
+    def test_every_word_is_a_prefix(self):
+        make_doctor(name='Dr Achieng', specialty='Cardiologist', location='Nairobi', email='a@example.com')
+        make_doctor(name='Dr Baraka', specialty='Cardiologist', location='Mombasa', hospital='Coast General',
+                    email='b@example.com')
+        make_doctor(name='Dr Chebet', specialty='Dentist', location='Nairobi', email='c@example.com')
+        self.assertEqual(self.search('card nai'), ['Dr Achieng'])
+        self.assertEqual(sorted(self.search('card')), ['Dr Achieng', 'Dr Baraka'])
+
+    def test_ranked_by_bm25_over_rating(self):
+        # A name hit weighs more than a hospital hit, whatever the ratings
+        make_doctor(name='Dr Grace Mwangi', hospital='Otieno Memorial', email='a@example.com',
+                    rating_sum=10, review_count=1, average_rating=10.0)
+        make_doctor(name='Dr Peter Otieno', email='b@example.com', rating_sum=2, review_count=1, average_rating=2.0)
+        self.assertEqual(self.search('otieno'), ['Dr Peter Otieno', 'Dr Grace Mwangi'])
+
+    def test_cursor_walks_every_match_once(self):
+        for i in range(25):
+            make_doctor(name=f'Dr Surgeon {i}', specialty='Surgeon', email=f's{i}@example.com',
+                        rating_sum=i % 7, review_count=1, average_rating=float(i % 7))
+        make_doctor(name='Dr Other', specialty='Dentist', email='other@example.com')
+        expected = [row['id'] for row in APIClient().get('/api/doctors/?search=surg&page_size=100').data['results']]
+        self.assertEqual(len(expected), 25)
+
+        seen, url = [], '/api/doctors/?search=surg&page_size=10'
+        while url:
+            data = APIClient().get(url).data
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, expected)
+
+    def test_missing_triggers_fall_back_to_icontains(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_ai')
+        self.assertFalse(search.search_index_available(connection))
+        make_doctor(name='Dr Wanjiru Kariuki')
+        self.assertEqual(self.search('Kariuki'), ['Dr Wanjiru Kariuki'])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_doctor(name='Dr A', specialty='Dentist', location='Nairobi', rating_sum=18, review_count=2, average_rating=9.0)
+        make_doctor(name='Dr B', specialty='Dentist', location='Mombasa', rating_sum=6, review_count=1, average_rating=6.0)
+        make_doctor(name='Dr C', specialty='Cardiologist', location='Nairobi')
+
+    def test_counts_and_review_weighted_average(self):
+        data = APIClient().get('/api/doctors/facets/').data
+        self.assertEqual(data['specialty'], [
+            {'value': 'Dentist', 'count': 2, 'average_rating': 8.0},
+            {'value': 'Cardiologist', 'count': 1, 'average_rating': 0.0},
+        ])
+        self.assertEqual([row['value'] for row in data['location']], ['Nairobi', 'Mombasa'])
+
+    def test_honors_filters(self):
+        data = APIClient().get('/api/doctors/facets/?location=Nairobi').data
+        self.assertEqual([(row['value'], row['count']) for row in data['specialty']], [('Cardiologist', 1), ('Dentist', 1)])
+
+
+class NearbyDoctorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Nairobi CBD, ~3km west in Westlands, ~15km out in Karen, and Mombasa
+        make_doctor(name='Dr CBD', latitude=-1.2864, longitude=36.8172)
+        make_doctor(name='Dr Westlands', latitude=-1.2676, longitude=36.8108)
+        make_doctor(name='Dr Karen', latitude=-1.3194, longitude=36.7073)
+        make_doctor(name='Dr Mombasa', latitude=-4.0435, longitude=39.6682)
+        make_doctor(name='Dr Unplaced')
+
+    def near(self, query):
+        return APIClient().get(f'/api/doctors/?near=-1.2800,36.8150&{query}')
+
+    def test_within_radius_nearest_first(self):
+        results = self.near('radius_km=5').data['results']
+        self.assertEqual([row['name'] for row in results], ['Dr CBD', 'Dr Westlands'])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+        self.assertAlmostEqual(
+            results[1]['distance_km'], geo.haversine_km(-1.28, 36.815, -1.2676, 36.8108), places=6
+        )
+        names = [row['name'] for row in self.near('radius_km=50').data['results']]
+        self.assertEqual(names, ['Dr CBD', 'Dr Westlands', 'Dr Karen'])
+
+    def test_keyset_pages_follow_distance(self):
+        client, names = APIClient(), []
+        url = '/api/doctors/?near=-1.2800,36.8150&radius_km=50&page_size=1'
+        while url:
+            data = client.get(url).data
+            names += [row['name'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(names, ['Dr CBD', 'Dr Westlands', 'Dr Karen'])
+
+    def test_combines_with_filters(self):
+        Doctor.objects.filter(name='Dr CBD').update(specialty='Dentist')
+        results = self.near('radius_km=50&specialty=Cardiologist').data['results']
+        self.assertEqual([row['name'] for row in results], ['Dr Westlands', 'Dr Karen'])
+
+    def test_geo_cell_follows_coordinates(self):
+        doctor = Doctor.objects.get(name='Dr Unplaced')
+        self.assertIsNone(doctor.geo_cell)
+        doctor.latitude, doctor.longitude = 57.64911, 10.40744
+        doctor.save(update_fields=['latitude', 'longitude'])
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.geo_cell, 'u4pruydq')
+
+    def test_invalid_parameters(self):
+        for query in ['near=abc', 'near=1,2,3', 'near=91,0', 'near=0,0&radius_km=0', 'near=0,0&radius_km=x']:
+            self.assertEqual(APIClient().get(f'/api/doctors/?{query}').status_code, 400, query)
+
+    def test_covering_cells_contain_points_in_radius(self):
+        lat, lng = -1.28, 36.815
+        for radius in (0.5, 5, 50, 400):
+            cells = geo.covering_cells(lat, lng, radius)
+            self.assertLessEqual(len(cells), geo.MAX_COVERING_CELLS)
+            # Points just inside the radius due north, east, south and west
+            dlat = radius / 111.3 * 0.99
+            for point in [(lat + dlat, lng), (lat - dlat, lng), (lat, lng + dlat), (lat, lng - dlat)]:
+                self.assertTrue(any(geo.geohash(*point).startswith(cell) for cell in cells), (radius, point))
+
+
+def make_cursor(ordering, position, reverse=0):
+    payload = json.dumps({'o': ordering, 'p': position, 'r': reverse})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(7):
+            make_doctor(name=f'Dr {i}', email=f'{i}@example.com', rating_sum=i % 3, review_count=1,
+                        average_rating=float(i % 3))
+
+    def page(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def names(self, data):
+        return [row['name'] for row in data['results']]
+
+    def test_forward_and_back(self):
+        everything = self.names(self.page('/api/doctors/?page_size=100'))
+        first = self.page('/api/doctors/?page_size=3')
+        self.assertIsNone(first['previous'])
+        second = self.page(first['next'])
+        third = self.page(second['next'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(self.names(first) + self.names(second) + self.names(third), everything)
+
+        back = self.page(third['previous'])
+        self.assertEqual(self.names(back), self.names(second))
+        self.assertEqual(self.names(self.page(back['previous'])), self.names(first))
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        next_url = self.page('/api/doctors/?page_size=3&ordering=name')['next']
+        cursor = parse_qs(urlsplit(next_url).query)['cursor'][0]
+        self.assertEqual(APIClient().get(f'/api/doctors/?page_size=3&cursor={cursor}').status_code, 404)
+
+    def test_malformed_cursors_are_404_not_500(self):
+        ordering = ['-average_rating', '-id']
+        cursors = ['not-base64!', make_cursor(ordering, [1]), make_cursor(ordering, [1, 2], reverse=5)] + [
+            make_cursor(ordering, position) for position in (['abc', 1], [{'a': 1}, 1], [None, None], [1.5, 'x'])
+        ]
+        for cursor in cursors:
+            for path in ('/api/doctors/', '/api/async/doctors/'):
+                self.assertEqual(APIClient().get(path, {'cursor': cursor}).status_code, 404, (path, cursor))
+
+        review_ordering = ['-created_at', '-id']
+        for position in (['yesterday', 1], [1, 'x']):
+            response = APIClient().get('/api/reviews/', {'doctor_id': 1, 'cursor': make_cursor(review_ordering, position)})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class ExplainQueriesTests(TestCase):
+    def test_review_and_saved_doctor_lists_are_indexed(self):
+        user = User.objects.create(username='u', email='u@example.com')
+        doctor = make_doctor()
+        Review.objects.create(user=user, doctor=doctor, rating=7)
+        SavedDoctor.objects.create(user=user, doctor=doctor)
+        out = io.StringIO()
+        call_command('explain_queries', stdout=out, no_color=True)
+        lines = out.getvalue().splitlines()
+        for label in ('reviews: ?doctor_id=', 'reviews: ?mine=true', 'saved doctors'):
+            self.assertIn(f'{label}: indexed', lines)
+
+
+class ReviewListTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        for i in range(12):
+            user = User.objects.create(username=f'reviewer{i}', email=f'reviewer{i}@example.com')
+            Review.objects.create(doctor=self.doctor, user=user, rating=i % 10 + 1)
+
+    def test_one_query_per_page_newest_first(self):
+        client = APIClient()
+        ids, url = [], f'/api/reviews/?doctor_id={self.doctor.id}&page_size=5'
+        while url:
+            with self.assertNumQueries(1):
+                data = client.get(url).data
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_list_rows_match_detail_serializer(self):
+        client = APIClient()
+        row = client.get(f'/api/reviews/?doctor_id={self.doctor.id}').data['results'][0]
+        self.assertEqual(row, client.get(f"/api/reviews/{row['id']}/").data)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctors = [make_doctor(name=f'Dr {i}', average_rating=i % 3) for i in range(7)]
+        for i in range(3):
+            user = User.objects.create(username=f'reviewer{i}', email=f'reviewer{i}@example.com')
+            Review.objects.create(doctor=self.doctors[0], user=user, rating=i + 1)
+
+    def assert_same_pages(self, sync_url, async_url):
+        """Walk both cursor chains and compare every page."""
+        client = APIClient()
+        while sync_url:
+            expected = client.get(sync_url).json()
+            actual = client.get(async_url).json()
+            self.assertEqual(actual['results'], expected['results'])
+            self.assertEqual(bool(actual['next']), bool(expected['next']))
+            sync_url, async_url = expected['next'], actual['next']
+
+    def test_doctor_list_matches_sync_view(self):
+        self.assert_same_pages('/api/doctors/?page_size=3', '/api/async/doctors/?page_size=3')
+        self.assert_same_pages('/api/doctors/?ordering=name&page_size=2', '/api/async/doctors/?ordering=name&page_size=2')
+
+    def test_review_list_matches_sync_view(self):
+        query = f'?doctor_id={self.doctors[0].id}&page_size=2'
+        self.assert_same_pages(f'/api/reviews/{query}', f'/api/async/reviews/{query}')
+
+    async def test_detail_and_errors_under_async_client(self):
+        client = AsyncClient()
+        response = await client.get(f'/api/async/doctors/{self.doctors[1].id}/')
+        self.assertEqual(response.json()['name'], 'Dr 1')
+        self.assertEqual((await client.get('/api/async/doctors/0/')).status_code, 404)
+        self.assertEqual((await client.get('/api/async/doctors/?cursor=bogus')).status_code, 404)
+        self.assertEqual((await client.get('/api/async/doctors/?near=abc')).status_code, 400)
+
+
+class SavedStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='patient', email='patient@example.com')
+        self.doctors = [make_doctor(name=f'Dr {i}') for i in range(4)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def saved_ids(self):
+        return set(SavedDoctor.objects.filter(user=self.user).values_list('doctor_id', flat=True))
+
+    def test_bulk_save_and_unsave(self):
+        a, b, c, d = (doctor.id for doctor in self.doctors)
+        SavedDoctor.objects.create(user=self.user, doctor_id=c)
+        with self.assertNumQueries(5):  # savepoint, lookup, insert, delete, release
+            response = self.client.post('/api/saved-doctors/bulk/', {'save': [a, b, 999], 'unsave': [c]}, format='json')
+        self.assertEqual(response.data, {'saved': [a, b], 'unsaved': [c], 'not_found': [999]})
+        self.assertEqual(self.saved_ids(), {a, b})
+
+        # Saving again is a no-op rather than an IntegrityError
+        self.client.post('/api/saved-doctors/bulk/', {'save': [a]}, format='json')
+        self.assertEqual(self.saved_ids(), {a, b})
+
+    def test_conflicting_ids_rejected(self):
+        doctor_id = self.doctors[0].id
+        response = self.client.post('/api/saved-doctors/bulk/', {'save': [doctor_id], 'unsave': [doctor_id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range_ids_rejected(self):
+        for body in ({'save': [10 ** 20]}, {'unsave': [10 ** 20]}, {'unsave': [0]}):
+            response = self.client.post('/api/saved-doctors/bulk/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(SavedDoctor.objects.exists())
+
+    def test_is_saved_flag_for_authenticated_lists_only(self):
+        SavedDoctor.objects.create(user=self.user, doctor=self.doctors[1])
+        with self.assertNumQueries(1):
+            results = self.client.get('/api/doctors/').data['results']
+        self.assertEqual({row['id'] for row in results if row['is_saved']}, {self.doctors[1].id})
+
+        self.client.force_authenticate(None)
+        self.assertNotIn('is_saved', APIClient().get('/api/doctors/').data['results'][0])
+
+
+class ToggleSavedDoctorTests(TransactionTestCase):
+    # Not TestCase: statements are counted in autocommit mode, as requests run in production
+
+    def setUp(self):
+        self.user = User.objects.create(username='patient', email='patient@example.com')
+        self.doctor = make_doctor()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def toggle(self, doctor_id):
+        return self.client.post('/api/saved-doctors/toggle/', {'doctor_id': doctor_id}, format='json')
+
+    def test_save_then_unsave_in_at_most_two_statements(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.toggle(self.doctor.id).data['status'], 'saved')
+        self.assertTrue(SavedDoctor.objects.filter(user=self.user, doctor=self.doctor).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.toggle(self.doctor.id).data['status'], 'unsaved')
+        self.assertFalse(SavedDoctor.objects.exists())
+
+    def test_unknown_doctor(self):
+        self.assertEqual(self.toggle(999).status_code, 404)
+        self.assertEqual(self.toggle('abc').status_code, 400)
+        self.assertEqual(self.toggle(10 ** 20).status_code, 404)
+        self.assertEqual(self.toggle(-1).status_code, 404)
+        self.assertFalse(SavedDoctor.objects.exists())
+
+
+class ToggleSavedDoctorConcurrencyTests(TransactionTestCase):
+    """Hammer the toggle from a thread pool: every request must succeed and state must stay consistent."""
+
+    def test_concurrent_toggles(self):
+        user = User.objects.create(username='patient', email='patient@example.com')
+        doctor = make_doctor()
+
+        def toggle(_):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return client.post('/api/saved-doctors/toggle/', {'doctor_id': doctor.id}, format='json').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(toggle, range(64)))
+
+        self.assertEqual(set(statuses), {200})
+        self.assertLessEqual(SavedDoctor.objects.filter(user=user, doctor=doctor).count(), 1)
+
+
+class AuthThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': 'wrong'},
+                                format='json', REMOTE_ADDR=ip)
+
+    def test_per_username_bucket_rejects_before_any_db_work(self):
+        for _ in range(5):
+            self.assertEqual(self.login('victim').status_code, 401)
+        with self.assertNumQueries(0):
+            response = self.login('victim', ip='10.0.0.2')  # a different IP doesn't help
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        # A Bearer header doesn't buy a user lookup before the 429 either
+        token = RefreshToken.for_user(User.objects.create(username='holder', email='holder@example.com'))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        with mock.patch.object(CachedJWTAuthentication, 'authenticate') as authenticate, self.assertNumQueries(0):
+            self.assertEqual(self.login('victim', ip='10.0.0.4').status_code, 429)
+        authenticate.assert_not_called()
+        self.client.credentials()
+        self.assertEqual(self.login('someone-else', ip='10.0.0.3').status_code, 401)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'auth_ip': '3/min', 'auth_username': '100/min'}})
+    def test_per_ip_bucket(self):
+        for i in range(3):
+            self.assertEqual(self.login(f'user{i}').status_code, 401)
+        self.assertEqual(self.login('user9').status_code, 429)
+        self.assertEqual(self.login('user9', ip='10.0.0.2').status_code, 401)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'auth_ip': '20/min', 'auth_username': '5/min'}})
+    def test_concurrent_burst_gets_no_extra_attempts(self):
+        request = RequestFactory().post('/api/auth/login/', REMOTE_ADDR='10.0.0.9')
+        cache_get = LocMemCache.get
+
+        def slow_get(*args, **kwargs):
+            # Widen the gap between reading the counters and taking a slot
+            value = cache_get(*args, **kwargs)
+            time.sleep(0.005)
+            return value
+
+        # On the class: each thread has its own cache instance (sharing one store)
+        with mock.patch.object(LocMemCache, 'get', autospec=True, side_effect=slow_get), \
+                ThreadPoolExecutor(max_workers=8) as pool:
+            allowed = list(pool.map(lambda _: AuthIPThrottle().allow_request(request, None), range(64)))
+        self.assertEqual(allowed.count(True), 20)
+
+    def test_falls_back_to_process_memory_when_cache_is_down(self):
+        with mock.patch('doctor_search_app.throttling.cache.get', side_effect=ConnectionError):
+            statuses = [self.login('victim').status_code for _ in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+
+
+CHEAP_COSTS = {'pbkdf2_sha256': {'iterations': 1000}, 'scrypt': {'work_factor': 2 ** 4}}
+
+
+@override_settings(PASSWORD_HASHER_COSTS=CHEAP_COSTS)
+class PasswordHasherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('patient', 'patient@example.com', 'old-pass-123')
+
+    def login(self):
+        response = APIClient().post('/api/auth/login/', {'username': 'patient', 'password': 'old-pass-123'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_costs_come_from_settings(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.login().startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_upgrades_the_cost(self):
+        with override_settings(PASSWORD_HASHER_COSTS={**CHEAP_COSTS, 'pbkdf2_sha256': {'iterations': 2000}}):
+            self.assertTrue(self.login().startswith('pbkdf2_sha256$2000$'))
+
+    def test_login_moves_to_the_preferred_hasher(self):
+        hashers = ['doctor_search_app.hashers.ScryptPasswordHasher', 'doctor_search_app.hashers.PBKDF2PasswordHasher']
+        with override_settings(PASSWORD_HASHERS=hashers):
+            self.assertTrue(self.login().startswith('scrypt$16$'))
+            self.assertTrue(self.login().startswith('scrypt$16$'))
+
+    def test_suggested_costs_scale_with_the_budget(self):
+        self.assertEqual(PBKDF2PasswordHasher().cost_for(2.5), {'iterations': 2000})
+        self.assertEqual(ScryptPasswordHasher().cost_for(3), {'work_factor': 2 ** 5})
+
+
+@override_settings(PASSWORD_HASHER_COSTS=CHEAP_COSTS)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('patient', 'patient@example.com', 'old-pass-123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_repeat_requests_skip_the_user_query(self):
+        with self.assertNumQueries(2):  # the user, then the saved list
+            self.assertEqual(self.client.get('/api/saved-doctors/').status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/saved-doctors/').status_code, 200)
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.client.get('/api/saved-doctors/')
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get('/api/saved-doctors/').status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get('/api/saved-doctors/')
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/saved-doctors/').status_code, 401)
+
+    def test_cache_outage_falls_back_to_the_database(self):
+        with mock.patch('doctor_search_app.authentication.cache.get', side_effect=ConnectionError):
+            self.assertEqual(self.client.get('/api/saved-doctors/').status_code, 200)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        make_doctor()
+        self.admin = User.objects.create(username='ops', email='ops@example.com', admin=True)
+
+    def scrape(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_records_latency_and_sql_per_route(self):
+        APIClient().get('/api/doctors/')
+        APIClient().get('/api/doctors/')
+        text = self.scrape()
+        self.assertIn('doctor_search_http_requests_total{route="doctor-list",method="GET",status="2xx"} 2', text)
+        self.assertIn('doctor_search_http_request_duration_seconds_count{route="doctor-list"} 2', text)
+        # First call runs the page query, the second is a response-cache hit
+        self.assertIn('doctor_search_http_request_sql_queries_sum{route="doctor-list"} 1', text)
+        self.assertIn('doctor_search_http_request_sql_queries_bucket{route="doctor-list",le="0"} 1', text)
+
+    def test_async_views_are_counted(self):
+        APIClient().get('/api/async/doctors/')
+        self.assertIn('doctor_search_http_request_sql_queries_sum{route="async-doctor-list"} 1', self.scrape())
+
+    def test_admin_only(self):
+        self.assertEqual(APIClient().get('/api/metrics/').status_code, 401)
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='patient', email='patient@example.com'))
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_records_nothing(self):
+        APIClient().get('/api/doctors/')
+        self.assertNotIn('doctor-list', self.scrape())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='ops', email='ops@example.com', admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.doctors = [make_doctor(name=f'Dr {i}', location='Nairobi' if i % 2 else 'Mombasa') for i in range(5)]
+        for i, doctor in enumerate(self.doctors):
+            Review.objects.create(doctor=doctor, user=self.admin, rating=i + 1, comment=f'line one, "quoted"\nline {i}')
+        ratings.rebuild_rating_aggregates()
+
+    def download(self, url, queries):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(queries):
+            return b''.join(response.streaming_content).decode()
+
+    def test_doctor_csv_is_filtered_and_carries_aggregates(self):
+        body = self.download('/api/doctors/export/?fmt=csv&location=Nairobi', queries=1)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual({row['name'] for row in rows}, {'Dr 1', 'Dr 3'})
+        self.assertEqual({row['average_rating'] for row in rows}, {'2.0', '4.0'})
+
+    def test_review_ndjson_joins_doctor_in_one_query(self):
+        body = self.download('/api/reviews/export/?fmt=ndjson', queries=1)
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 5)
+        record = next(r for r in records if r['doctor_name'] == 'Dr 4')
+        self.assertEqual((record['user'], record['rating'], record['doctor_average_rating']), ('ops', 5, 5.0))
+        self.assertEqual(record['comment'], 'line one, "quoted"\nline 4')
+
+    def test_rejects_unknown_format_and_non_admins(self):
+        self.assertEqual(self.client.get('/api/doctors/export/?fmt=xml').status_code, 400)
+        patient = APIClient()
+        patient.force_authenticate(User.objects.create(username='patient', email='patient@example.com'))
+        self.assertEqual(patient.get('/api/reviews/export/').status_code, 403)
+
+
+class RosterImportTests(TestCase):
+    header = 'name,specialty,hospital,location,email,cell,image,latitude,longitude\n'
+
+    def setUp(self):
+        self.existing = make_doctor(name='Dr Old', hospital='Mater', email='old@example.com', rating_sum=9, review_count=1)
+        self.renamed = make_doctor(name='Dr Maiden', hospital='Mater', email='moved@example.com')
+
+    def test_upserts_on_natural_key_and_email(self):
+        body = self.header + (
+            'Dr Old,Dentist,Mater,Nairobi,old@example.com,0711,,-1.3,36.8\n'       # update by (name, hospital)
+            'Dr Married,Physician,Mater,Nairobi,moved@example.com,0722,,,\n'        # rename via email
+            'Dr New,Physician,Aga Khan,Kisumu,new@example.com,0733,,,\n'            # create
+            'Dr Broken,Physician,Aga Khan,Kisumu,not-an-email,0744,,,\n'            # invalid
+        )
+        report = import_doctors(io.StringIO(body), 'csv', chunk_size=2)
+        self.assertEqual((report.created, report.updated, report.failed), (1, 2, 1))
+        self.assertEqual(report.errors[0]['row'], 5)
+        self.assertIn('email', report.errors[0]['errors'])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.specialty, self.existing.cell, self.existing.review_count), ('Dentist', '0711', 1))
+        self.assertIsNotNone(self.existing.geo_cell)
+        self.renamed.refresh_from_db()
+        self.assertEqual(self.renamed.name, 'Dr Married')
+        self.assertTrue(Doctor.objects.filter(name='Dr New', hospital='Aga Khan').exists())
+
+    def test_queries_per_chunk_not_per_row(self):
+        rows = ''.join(f'Dr {i},Physician,Clinic {i},Nairobi,dr{i}@example.com,07{i},,,\n' for i in range(50))
+        stream = io.StringIO(self.header + rows)
+        with self.assertNumQueries(4):  # lookup, SAVEPOINT, INSERT ... ON CONFLICT, RELEASE
+            report = import_doctors(stream, 'csv', chunk_size=50)
+        self.assertEqual(report.created, 50)
+
+    def test_rejected_chunk_is_retried_row_by_row(self):
+        bulk_create = Doctor.objects.bulk_create
+
+        def reject_bad_rows(objs, *args, **kwargs):
+            if any(doctor.name == 'Dr Bad' for doctor in objs):
+                raise IntegrityError('rejected')
+            return bulk_create(objs, *args, **kwargs)
+
+        rows = ''.join(f'Dr {i},Physician,Clinic,Nairobi,dr{i}@example.com,07{i},,,\n' for i in ('A', 'Bad', 'C'))
+        with mock.patch.object(Doctor.objects, 'bulk_create', side_effect=reject_bad_rows):
+            report = import_doctors(io.StringIO(self.header + rows), 'csv')
+        self.assertEqual((report.created, report.failed, report.errors[0]['row']), (2, 1, 3))
+        self.assertEqual(set(Doctor.objects.filter(hospital='Clinic').values_list('name', flat=True)), {'Dr A', 'Dr C'})
+
+    def test_json_array_is_read_incrementally(self):
+        records = [{'name': f'Dr {i}', 'hospital': 'H', 'specialty': 'S', 'location': 'L',
+                    'email': f'd{i}@example.com', 'cell': '07'} for i in range(30)]
+        parsed = list(read_json(io.StringIO(json.dumps(records, indent=1)), buffer_size=7))
+        self.assertEqual([record for _, record in parsed], records)
+        report = import_doctors(io.StringIO(json.dumps(records + [{'name': 'x'}])), 'json')
+        self.assertEqual((report.created, report.failed, report.errors[0]['row']), (30, 1, 31))
+
+    def test_admin_endpoint(self):
+        admin = User.objects.create(username='ops', email='ops@example.com', admin=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = io.BytesIO(b'{"name": "Dr Nd", "hospital": "H", "specialty": "S", "location": "L", '
+                            b'"email": "nd@example.com", "cell": "07"}\nnot json\n')
+        upload.name = 'roster.ndjson'
+        data = client.post('/api/doctors/import/', {'file': upload}, format='multipart').data
+        self.assertEqual((data['created'], data['failed'], data['errors'][0]['row']), (1, 1, 2))
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com') for i in range(3)]
+        self.doctor = make_doctor(name='Dr First')
+        self.other = make_doctor(name='Dr Second', email='second@example.com')
+        self.client = APIClient()
+
+    def review(self, user, doctor, rating):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reviews/', {'doctor': doctor.id, 'rating': rating})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def aggregates(self, doctor):
+        doctor.refresh_from_db()
+        return doctor.rating_sum, doctor.review_count, doctor.average_rating
+
+    def test_update_move_and_delete_keep_aggregates(self):
+        first = self.review(self.users[0], self.doctor, 8)
+        self.review(self.users[1], self.doctor, 4)
+        self.assertEqual(self.aggregates(self.doctor), (12, 2, 6.0))
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.patch(f'/api/reviews/{first}/', {'rating': 10}).status_code, 200)
+        self.assertEqual(self.aggregates(self.doctor), (14, 2, 7.0))
+
+        response = self.client.patch(f'/api/reviews/{first}/', {'doctor': self.other.id, 'rating': 9})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aggregates(self.doctor), (4, 1, 4.0))
+        self.assertEqual(self.aggregates(self.other), (9, 1, 9.0))
+
+        self.assertEqual(self.client.delete(f'/api/reviews/{first}/').status_code, 204)
+        self.assertEqual(self.aggregates(self.other), (0, 0, 0.0))
+        self.assertEqual(self.aggregates(self.doctor), (4, 1, 4.0))
+
+    def test_rebuild_ratings_repairs_drift(self):
+        self.review(self.users[0], self.doctor, 8)
+        self.review(self.users[1], self.doctor, 5)
+        Doctor.objects.update(rating_sum=99, review_count=7, average_rating=1.0)
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        self.assertEqual(self.aggregates(self.doctor), (13, 2, 6.5))
+        self.assertEqual(self.aggregates(self.other), (0, 0, 0.0))
+
+
+@override_settings(RANKING_PRIOR_MEAN=7.0, RANKING_PRIOR_WEIGHT=5)
+class RankingScoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com') for i in range(10)]
+        self.lucky = make_doctor(name='Dr One Review')
+        self.steady = make_doctor(name='Dr Many Reviews')
+        self.client = APIClient()
+
+    def review(self, user, doctor, rating):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reviews/', {'doctor': doctor.id, 'rating': rating})
+        self.assertEqual(response.status_code, 201)
+
+    def test_new_doctor_starts_at_prior_mean(self):
+        self.lucky.refresh_from_db()
+        self.assertEqual(self.lucky.ranking_score, 7.0)
+
+    def test_review_count_outweighs_a_single_perfect_score(self):
+        self.review(self.users[0], self.lucky, 10)
+        for user in self.users:
+            self.review(user, self.steady, 9)
+        self.lucky.refresh_from_db()
+        self.steady.refresh_from_db()
+        self.assertAlmostEqual(self.lucky.ranking_score, (10 + 35) / 6)
+        self.assertAlmostEqual(self.steady.ranking_score, (90 + 35) / 15)
+
+        names = [row['name'] for row in APIClient().get('/api/doctors/?ordering=-ranking_score').data['results']]
+        self.assertEqual(names, ['Dr Many Reviews', 'Dr One Review'])
+        names = [row['name'] for row in APIClient().get('/api/doctors/').data['results']]
+        self.assertEqual(names, ['Dr One Review', 'Dr Many Reviews'])
+
+    @override_settings(RANKING_PRIOR_MEAN=None)
+    def test_rebuild_uses_global_mean(self):
+        for user in self.users[:4]:
+            self.review(user, self.steady, 6)
+        ratings.rebuild_rating_aggregates()
+        self.lucky.refresh_from_db()
+        self.assertEqual(self.lucky.ranking_score, 6.0)
+        self.assertEqual(ratings.ranking_prior(), (6.0, 5))
+
+    @override_settings(RANKING_PRIOR_MEAN=None)
+    def test_workers_share_the_stored_prior(self):
+        for user in self.users[:4]:
+            self.review(user, self.steady, 6)
+        ratings.refresh_ranking_scores()
+        self.review(self.users[0], self.lucky, 10)
+        # A worker with an empty cache reads the stored mean, not today's global mean
+        cache.clear()
+        self.assertEqual(ratings.ranking_prior(), (6.0, 5))
+        self.assertEqual(RankingPrior.objects.get().mean, 6.0)
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com') for i in range(4)]
+        self.doctor = make_doctor()
+        self.client = APIClient()
+
+    def review(self, user, rating):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reviews/', {'doctor': self.doctor.id, 'rating': rating})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def histogram(self):
+        stats = APIClient().get(f'/api/doctors/{self.doctor.id}/stats/').data
+        return stats, {row['rating']: row['count'] for row in stats['histogram'] if row['count']}
+
+    def test_review_writes_maintain_the_buckets(self):
+        first = self.review(self.users[0], 8)
+        self.review(self.users[1], 8)
+        self.review(self.users[2], 3)
+        stats, histogram = self.histogram()
+        self.assertEqual((stats['count'], stats['mean']), (3, 19 / 3))
+        self.assertEqual(histogram, {8: 2, 3: 1})
+        self.assertEqual(len(stats['histogram']), 10)
+
+        self.client.force_authenticate(self.users[0])
+        self.client.patch(f'/api/reviews/{first}/', {'rating': 10})
+        cache.clear()
+        self.assertEqual(self.histogram()[1], {10: 1, 8: 1, 3: 1})
+        self.client.delete(f'/api/reviews/{first}/')
+        cache.clear()
+        self.assertEqual(self.histogram()[1], {8: 1, 3: 1})
+        # One row per (month, rating) seen, even after it empties
+        self.assertEqual(DoctorRatingBucket.objects.count(), 3)
+
+    def test_stats_read_buckets_not_reviews(self):
+        for user in self.users:
+            self.review(user, 7)
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.histogram()
+        self.assertEqual(len(captured), 2)
+        self.assertFalse([q for q in captured if 'doctor_search_app_review' in q['sql']])
+        self.assertEqual(APIClient().get('/api/doctors/999/stats/').status_code, 404)
+
+    def test_monthly_trend_and_rebuild(self):
+        for user, rating, created in [
+            (self.users[0], 4, datetime(2026, 5, 3, tzinfo=UTC)),
+            (self.users[1], 6, datetime(2026, 6, 20, tzinfo=UTC)),
+            (self.users[2], 9, datetime(2026, 8, 1, tzinfo=UTC)),
+            (self.users[3], 8, datetime(2026, 10, 9, tzinfo=UTC)),
+        ]:
+            Review.objects.filter(pk=self.review(user, rating)).update(created_at=created)
+        ratings.rebuild_rating_aggregates([self.doctor.id])
+        self.doctor.refresh_from_db()
+
+        trend = ratings.rating_stats(self.doctor, today=date(2026, 10, 17))['trend']
+        self.assertEqual([m['month'] for m in trend['months']], [date(2026, month, 1) for month in range(5, 11)])
+        self.assertEqual([m['count'] for m in trend['months']], [1, 1, 0, 1, 0, 1])
+        self.assertEqual(trend['months'][1]['mean'], 6)
+        self.assertIsNone(trend['months'][2]['mean'])
+        self.assertEqual((trend['recent_mean'], trend['previous_mean'], trend['change']), (8.5, 5, 3.5))
+
+
+@override_settings(OTP_MAX_ATTEMPTS=3)
+class OTPChallengeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('patient', 'patient@example.com', 'old-pass-123')
+
+    def reset_confirm(self, otp, password='N3w-pass-456'):
+        return APIClient().post('/api/auth/password-reset/confirm/', {
+            'email': 'patient@example.com', 'otp': otp, 'new_password': password
+        }, format='json')
+
+    def test_sending_a_code_never_writes_the_user_row(self):
+        with CaptureQueriesContext(connection) as captured:
+            APIClient().post('/api/auth/password-reset/', {'email': 'patient@example.com'}, format='json')
+        self.assertFalse([q for q in captured if q['sql'].startswith('UPDATE "doctor_search_app_user"')])
+        challenge = OTPChallenge.objects.get()
+        self.assertEqual(len(challenge.code_hash), 64)
+
+    def test_reset_consumes_code_and_only_writes_password(self):
+        code = self.user.generate_otp(OTPChallenge.PASSWORD_RESET)
+        # A verify-email code is not a reset code
+        self.assertFalse(self.user.verify_otp(code, OTPChallenge.VERIFY_EMAIL))
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.reset_confirm(code).status_code, 200)
+        user_updates = [q['sql'] for q in captured if q['sql'].startswith('UPDATE "doctor_search_app_user"')]
+        self.assertEqual(len(user_updates), 1)
+        self.assertNotIn('"username"', user_updates[0])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3w-pass-456'))
+        self.assertFalse(OTPChallenge.objects.exists())
+        self.assertEqual(self.reset_confirm(code).status_code, 400)
+
+    def test_wrong_guesses_exhaust_the_challenge(self):
+        code = self.user.generate_otp(OTPChallenge.PASSWORD_RESET)
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(3):
+            self.assertFalse(self.user.verify_otp(wrong, OTPChallenge.PASSWORD_RESET))
+        self.assertEqual(OTPChallenge.objects.get().attempts, 3)
+        self.assertFalse(self.user.verify_otp(code, OTPChallenge.PASSWORD_RESET))
+        # A fresh code starts over
+        code = self.user.generate_otp(OTPChallenge.PASSWORD_RESET)
+        self.assertEqual(OTPChallenge.objects.count(), 1)
+        self.assertTrue(self.user.verify_otp(code, OTPChallenge.PASSWORD_RESET))
+
+    @override_settings(OTP_TTL_SECONDS=300)
+    def test_email_states_the_configured_lifetime(self):
+        APIClient().post('/api/auth/password-reset/', {'email': 'patient@example.com'}, format='json')
+        self.assertIn('It expires in 5 minutes.', OutboxEmail.objects.get().body)
+
+    def test_expired_codes_fail_and_are_purged(self):
+        code = self.user.generate_otp(OTPChallenge.VERIFY_EMAIL)
+        self.user.generate_otp(OTPChallenge.PASSWORD_RESET)
+        OTPChallenge.objects.filter(purpose=OTPChallenge.VERIFY_EMAIL).update(expires_at=timezone.now())
+        self.assertFalse(self.user.verify_otp(code, OTPChallenge.VERIFY_EMAIL))
+        call_command('purge_otp_challenges', stdout=io.StringIO())
+        self.assertEqual(list(OTPChallenge.objects.values_list('purpose', flat=True)), [OTPChallenge.PASSWORD_RESET])
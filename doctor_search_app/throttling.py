@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.throttling import BaseThrottle
+
+# Used when the shared cache is unreachable, so throttling degrades to per-process
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limit with token-bucket behaviour: `rate` ("5/min") is both the burst
+    size and the refill rate, so a client can spend 5 attempts at once and then
+    gets about one back every 12s as the burst slides out of the window.
+
+    It is kept as a sliding window counter: requests are counted per fixed
+    window, and the previous window's count is weighted by how much of it still
+    overlaps the last `duration` seconds. The counters live in the default
+    cache so every worker shares them, and each request takes its slot with an
+    atomic cache.incr(), so a concurrent burst can't spend more than `rate`.
+    If the cache errors, an in-process dict takes over.
+
+    DRF runs throttles in APIView.initial(), before the handler, so a rejected
+    request never reaches password hashing, the database or the outbox.
+    """
+    scope = None
+    cache_format = 'throttle:bucket:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        self.capacity, self.duration = self.parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(self.scope))
+        self.wait_time = None
+
+    @staticmethod
+    def parse_rate(rate):
+        """'5/min' -> (5, 60); None disables the throttle."""
+        if rate is None:
+            return 0, 1
+        num, period = rate.split('/')
+        return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+    def get_ident_for(self, request):
+        """Bucket identity for this request, or None to skip throttling."""
+        raise NotImplementedError('.get_ident_for() must be overridden')
+
+    def allow_request(self, request, view):
+        if not self.capacity:
+            return True
+        ident = self.get_ident_for(request)
+        if ident is None:
+            return True
+
+        key = self.cache_format % {'scope': self.scope, 'ident': ident}
+        window, offset = divmod(time.time(), self.duration)
+        window = int(window)
+        try:
+            previous, count = self._spend_shared(key, window)
+            shared = True
+        except Exception:
+            with _local_lock:
+                previous, count = self._spend_local(key, window)
+            shared = False
+
+        # Share of the previous window still inside the last `duration` seconds
+        overlap = 1 - offset / self.duration
+        if previous * overlap + count <= self.capacity:
+            return True
+        # Rejected attempts don't use up a slot
+        if shared:
+            try:
+                cache.decr(self._window_key(key, window))
+            except Exception:
+                pass  # The slot stays spent until the window expires
+        else:
+            with _local_lock:
+                _local_buckets[key][1] -= 1
+        self.wait_time = self._wait(previous, count - 1, offset)
+        return False
+
+    def _window_key(self, key, window):
+        return f'{key}:{window}'
+
+    def _spend_shared(self, key, window):
+        """Take a slot in the cache. Returns (previous window's count, this window's count including it)."""
+        previous = cache.get(self._window_key(key, window - 1), 0)
+        current = self._window_key(key, window)
+        # Kept while it is the current or the previous window
+        cache.add(current, 0, 2 * self.duration)
+        return previous, cache.incr(current)
+
+    def _spend_local(self, key, window):
+        last_window, count, previous = _local_buckets.get(key, (window, 0, 0))
+        if last_window != window:
+            previous = count if last_window == window - 1 else 0
+            count = 0
+        _local_buckets[key] = state = [window, count + 1, previous]
+        return previous, state[1]
+
+    def _wait(self, previous, count, offset):
+        """Seconds until one more request fits, given the counts without the rejected one."""
+        room = self.capacity - 1 - count
+        if room >= 0 and previous:
+            # Within this window, once enough of the previous one has slid out
+            return max(0.0, (1 - room / previous) * self.duration - offset)
+        # Only in a later window, where this window's count becomes the weighted one
+        return self.duration - offset + max(0.0, 1 - (self.capacity - 1) / count) * self.duration
+
+    def wait(self):
+        return self.wait_time
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    """Per client IP (honours NUM_PROXIES like DRF's own throttles)."""
+    scope = 'auth_ip'
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
+
+
+class AuthUsernameThrottle(TokenBucketThrottle):
+    """Per targeted account, so one user can't be stuffed from many IPs."""
+    scope = 'auth_username'
+
+    def get_ident_for(self, request):
+        try:
+            account = request.data.get('username') or request.data.get('email')
+        except (ParseError, AttributeError):
+            # Malformed body: the view itself will reject it
+            return None
+        if not account or not isinstance(account, str):
+            return None
+        # Hashed: keys must be cache-safe whatever the client sent
+        return hashlib.sha256(account.strip().lower().encode()).hexdigest()
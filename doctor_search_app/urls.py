@@ -9,8 +9,10 @@ from .views import (
     DoctorViewSet,
     ReviewViewSet,
     SavedDoctorViewSet,
-    ToggleSavedDoctorView  # <--- NEW IMPORT
+    ToggleSavedDoctorView,  # <--- NEW IMPORT
+    MetricsView
 )
+from .async_views import AsyncDoctorDetailView, AsyncDoctorListView, AsyncReviewListView
 
 # Create a router for the ViewSets
 router = DefaultRouter()
@@ -32,6 +34,14 @@ urlpatterns = [
     # This must be defined explicitly so the frontend can call /saved-doctors/toggle/
     path('saved-doctors/toggle/', ToggleSavedDoctorView.as_view(), name='saved-doctor-toggle'),
 
+    # --- Operations ---
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+
+    # --- Async read endpoints (for ASGI deployments) ---
+    path('async/doctors/', AsyncDoctorListView.as_view(), name='async-doctor-list'),
+    path('async/doctors/<int:pk>/', AsyncDoctorDetailView.as_view(), name='async-doctor-detail'),
+    path('async/reviews/', AsyncReviewListView.as_view(), name='async-review-list'),
+
     # --- Router Endpoints (Doctors & Reviews) ---
     path('', include(router.urls)),
 ]
\ No newline at end of file
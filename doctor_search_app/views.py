@@ -1,23 +1,36 @@
+import io
+
 from rest_framework import viewsets, status, views, generics, filters, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, get_user_model
-from django.core.mail import send_mail
-from django.conf import settings
-from django.db.models import Avg, Count
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.http import HttpResponse
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.tokens import RefreshToken
 from django_filters.rest_framework import DjangoFilterBackend
 
-from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 
 from rest_framework.permissions import IsAuthenticated
-from .models import Doctor, SavedDoctor
+from .models import MAX_ID, Doctor, OTPChallenge, SavedDoctor
 
 
 from .models import SavedDoctor
-from .serializers import SavedDoctorSerializer
+from .serializers import SavedDoctorSerializer, SavedDoctorBulkSerializer
 
 from .models import Doctor, Review
+from . import metrics, ratings
+from .directory_cache import cached_response
+from .exports import export_format, stream_export
+from .importer import FORMATS as IMPORT_FORMATS, import_doctors
+from .outbox import enqueue_email
+from .pagination import KeysetPagination
+from .permissions import IsSiteAdmin
+from .search import DoctorSearchFilter, NearFilter
+from .suggest import suggest as suggest_values
+from .throttling import AuthIPThrottle, AuthUsernameThrottle
 from .serializers import (
     UserRegistrationSerializer,
     LoginRequestSerializer,     # We will reuse this for standard login
@@ -25,7 +38,8 @@ from .serializers import (
     PasswordResetRequestSerializer,
     PasswordResetConfirmSerializer,
     DoctorSerializer,
-    ReviewSerializer
+    ReviewSerializer,
+    ReviewListSerializer
 )
 
 User = get_user_model()
@@ -35,16 +49,12 @@ User = get_user_model()
 # ===========================
 
 def send_otp_email(user, otp_code, subject_prefix="Account"):
-    """Sends the OTP to the user's email."""
+    """Queues the OTP mail; the `send_outbox` worker delivers it."""
     subject = f'{subject_prefix} Verification Code'
-    message = f'Hello {user.username},\n\nYour OTP code is: {otp_code}\n\nIt expires in 10 minutes.\n\nEnter this code to verify your account.'
-    email_from = settings.EMAIL_HOST_USER
-    recipient_list = [user.email]
-    
-    try:
-        send_mail(subject, message, email_from, recipient_list, fail_silently=False)
-    except Exception as e:
-        print(f"Email Error: {e}")
+    minutes = max(1, round(OTPChallenge.lifetime().total_seconds() / 60))
+    expires_in = f"{minutes} minute{'s' if minutes != 1 else ''}"
+    message = f'Hello {user.username},\n\nYour OTP code is: {otp_code}\n\nIt expires in {expires_in}.\n\nEnter this code to verify your account.'
+    enqueue_email(subject, message, [user.email])
 
 # ===========================
 # AUTH VIEWS
@@ -53,21 +63,23 @@ def send_otp_email(user, otp_code, subject_prefix="Account"):
 class RegisterView(views.APIView):
     """Step 1: Create Account (Inactive) -> Send OTP Email"""
     permission_classes = [permissions.AllowAny]
+    # No authenticators: a stray Bearer header would cost a user lookup before the throttles run
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle, AuthUsernameThrottle]
 
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
-            # Create the user but set to inactive until verified
+            # Create the user inactive until verified (one INSERT, no follow-up save)
             user = User.objects.create_user(
                 username=serializer.validated_data['username'],
                 email=serializer.validated_data['email'],
-                password=serializer.validated_data['password']
+                password=serializer.validated_data['password'],
+                is_active=False
             )
-            user.is_active = False # Deactivate until email verified
-            user.save()
 
             # Generate & Send OTP
-            otp = user.generate_otp()
+            otp = user.generate_otp(OTPChallenge.VERIFY_EMAIL)
             send_otp_email(user, otp, subject_prefix="Activate")
 
             return Response({
@@ -83,6 +95,8 @@ class RegisterView(views.APIView):
 class VerifyEmailView(views.APIView):
     """Step 2: Verify OTP -> Activate Account -> Auto Login"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle, AuthUsernameThrottle]
 
     def post(self, request):
         serializer = OTPVerifySerializer(data=request.data)
@@ -95,12 +109,11 @@ class VerifyEmailView(views.APIView):
             except User.DoesNotExist:
                 return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            if user.verify_otp(otp_input):
-                # 1. Activate User
+            if user.verify_otp(otp_input, OTPChallenge.VERIFY_EMAIL):
+                # 1. Activate User (the challenge was consumed by verify_otp)
                 user.is_active = True
                 user.is_email_verified = True
-                user.otp_code = None 
-                user.save()
+                user.save(update_fields=['is_active', 'is_email_verified'])
 
                 # 2. GENERATE TOKENS (Auto-Login Logic)
                 refresh = RefreshToken.for_user(user)
@@ -119,6 +132,8 @@ class VerifyEmailView(views.APIView):
 class LoginView(views.APIView):
     """Step 3: Standard Login (Username + Password)"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle, AuthUsernameThrottle]
 
     def post(self, request):
         # We reuse LoginRequestSerializer (username + password)
@@ -152,6 +167,8 @@ class LoginView(views.APIView):
 class PasswordResetRequestView(views.APIView):
     """Step 1 of Reset: Send OTP to Email"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle, AuthUsernameThrottle]
 
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
@@ -159,7 +176,7 @@ class PasswordResetRequestView(views.APIView):
             email = serializer.validated_data['email']
             try:
                 user = User.objects.get(email=email)
-                otp = user.generate_otp()
+                otp = user.generate_otp(OTPChallenge.PASSWORD_RESET)
                 send_otp_email(user, otp, subject_prefix="Password Reset")
             except User.DoesNotExist:
                 # Security: Do not reveal if email exists
@@ -171,6 +188,8 @@ class PasswordResetRequestView(views.APIView):
 class PasswordResetConfirmView(views.APIView):
     """Step 2 of Reset: Verify OTP -> Change Password"""
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [AuthIPThrottle, AuthUsernameThrottle]
 
     def post(self, request):
         serializer = PasswordResetConfirmSerializer(data=request.data)
@@ -181,10 +200,9 @@ class PasswordResetConfirmView(views.APIView):
 
             try:
                 user = User.objects.get(email=email)
-                if user.verify_otp(otp):
+                if user.verify_otp(otp, OTPChallenge.PASSWORD_RESET):
                     user.set_password(new_password)
-                    user.otp_code = None
-                    user.save()
+                    user.save(update_fields=['password'])
                     return Response({"message": "Password reset successful. Please login."}, status=status.HTTP_200_OK)
                 else:
                     return Response({"error": "Invalid or expired OTP"}, status=status.HTTP_400_BAD_REQUEST)
@@ -192,6 +210,17 @@ class PasswordResetConfirmView(views.APIView):
                 return Response({"error": "Invalid request"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# ===========================
+# OPERATIONS
+# ===========================
+
+class MetricsView(APIView):
+    """Per-route latency and SQL metrics of this process, in the Prometheus text format."""
+    permission_classes = [IsSiteAdmin]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ===========================
 # DOCTOR & REVIEW VIEWS
 # ===========================
@@ -202,6 +231,10 @@ class ToggleSavedDoctorView(APIView):
     Checks if the doctor is saved.
     If YES -> Deletes it (Unsave).
     If NO -> Creates it (Save).
+
+    At most two statements, no read-then-write window: the DELETE's row count
+    decides the direction, and the save is an insert that ignores duplicates,
+    so double-clicks can't raise IntegrityError.
     """
     permission_classes = [IsAuthenticated]
 
@@ -209,39 +242,148 @@ class ToggleSavedDoctorView(APIView):
         doctor_id = request.data.get('doctor_id')
         if not doctor_id:
             return Response({"error": "doctor_id is required"}, status=400)
-
-        doctor = get_object_or_404(Doctor, id=doctor_id)
-
-        # The magic happens here: get_or_create prevents the Unique Constraint error
-        saved_entry, created = SavedDoctor.objects.get_or_create(user=request.user, doctor=doctor)
-
-        if not created:
-            # If it wasn't created, it meant it existed. So we delete it.
-            saved_entry.delete()
+        try:
+            pk = int(doctor_id)
+        except (TypeError, ValueError):
+            return Response({"error": "doctor_id must be an integer"}, status=400)
+        if not 1 <= pk <= MAX_ID:
+            # No such doctor, and the database driver can't take the value
+            return Response({"detail": "No Doctor matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+
+        # 1. Unsave if it was saved
+        if SavedDoctor.delete_if_saved(request.user.pk, pk):
             return Response({'status': 'unsaved', 'doctor_id': doctor_id})
 
+        # 2. Otherwise save. Nothing inserted means a concurrent request saved it
+        # first (still "saved") or the doctor doesn't exist (rare path, one more query).
+        if not SavedDoctor.insert_if_doctor_exists(request.user.pk, pk) and not Doctor.objects.filter(pk=pk).exists():
+            return Response({"detail": "No Doctor matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+
         return Response({'status': 'saved', 'doctor_id': doctor_id})
 
 class DoctorViewSet(viewsets.ModelViewSet):
     """
     Lists doctors ranked by their average review rating.
     Supports search and filtering.
+    /doctors/{id}/stats/ summarizes a doctor's ratings without listing the reviews.
+    ?ordering=-ranking_score ranks by a Bayesian average that weighs review counts (see ratings.py).
+    Paginated with keyset cursors on (average_rating, id), (ranking_score, id) or (name, id).
+    ?search= runs against a full-text index and is ranked by relevance.
+    ?near=lat,lng&radius_km= keeps doctors within the radius, nearest first.
+    Anonymous list responses are cached per query string until the directory changes.
     """
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     
     # Search and Filter Configuration
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DoctorSearchFilter, NearFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ['name', 'specialty', 'hospital', 'location']
     filterset_fields = ['specialty', 'location']
-    ordering_fields = ['average_rating', 'name']
+    ordering_fields = ['average_rating', 'ranking_score', 'name']
+
+    # (column, lookup) pairs for /doctors/export/; the aggregates are stored columns
+    export_columns = [
+        ('id', 'id'), ('name', 'name'), ('specialty', 'specialty'), ('hospital', 'hospital'),
+        ('location', 'location'), ('email', 'email'), ('cell', 'cell'), ('image', 'image'),
+        ('latitude', 'latitude'), ('longitude', 'longitude'),
+        ('average_rating', 'average_rating'), ('review_count', 'review_count'), ('ranking_score', 'ranking_score'),
+    ]
 
     def get_queryset(self):
-        # Annotate adds virtual fields for sorting logic
-        return Doctor.objects.annotate(
-            average_rating=Avg('reviews__rating'),
-            review_count=Count('reviews')
-        ).order_by('-average_rating')
+        # average_rating / review_count are stored columns (see ratings.py)
+        queryset = Doctor.objects.order_by('-average_rating')
+        if self.request.user.is_authenticated:
+            # Heart icons: one EXISTS probe on the (user, doctor) unique index per row
+            saved = SavedDoctor.objects.filter(user=self.request.user, doctor=OuterRef('pk'))
+            queryset = queryset.annotate(is_saved=Exists(saved))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        return cached_response(request, lambda: super(DoctorViewSet, self).list(request, *args, **kwargs))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        GET /doctors/facets/ -> doctor count and average rating per specialty and location.
+        Honors ?search= and the filter params; served from the directory cache.
+        """
+        return cached_response(request, self._build_facets, prefix='doctors:facets')
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        GET /doctors/{id}/stats/ -> review count, mean, 1-10 histogram and monthly trend,
+        from the per-doctor rating buckets; served from the directory cache.
+        """
+        def build():
+            doctor = generics.get_object_or_404(Doctor.objects.only('review_count', 'average_rating'), pk=pk)
+            return Response(ratings.rating_stats(doctor))
+
+        return cached_response(request, build, prefix=f'doctors:stats:{pk}')
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        GET /doctors/suggest/?q=car&limit=5 -> up to `limit` (max 20) doctors, specialties,
+        hospitals and locations with a word starting with q. Served from memory (suggest.py).
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 5)), 20)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({"error": "limit must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(suggest_values(request.query_params.get('q', ''), limit))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsSiteAdmin])
+    def export(self, request):
+        """
+        GET /doctors/export/?fmt=csv|ndjson -> the whole (filtered) directory as a
+        streamed download, admins only.
+        """
+        fmt = export_format(request)
+        return stream_export(self.filter_queryset(self.get_queryset()), self.export_columns, fmt, 'doctors')
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsSiteAdmin],
+            parser_classes=[MultiPartParser])
+    def import_roster(self, request):
+        """
+        POST /doctors/import/ (multipart: file, optional format=csv|json|ndjson)
+        -> upserts the roster and reports created/updated counts and per-row errors.
+        For very large files prefer `manage.py import_doctors`.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            return Response({"error": f"format must be one of: {', '.join(IMPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Large uploads are spooled to disk by Django; read them as a text stream
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        report = import_doctors(stream, fmt)
+        return Response(report.as_dict())
+
+    def _build_facets(self):
+        # GROUP BY over the stored aggregate columns: no join against reviews
+        doctors = self.filter_queryset(self.get_queryset()).order_by()
+        average = ratings.average_of(Sum('rating_sum'), Sum('review_count'))
+        facets = {}
+        for field in self.filterset_fields:
+            rows = (
+                doctors.values(field)
+                .annotate(count=Count('id'), average_rating=average)
+                .order_by('-count', field)
+            )
+            facets[field] = [
+                {'value': row[field], 'count': row['count'], 'average_rating': round(row['average_rating'], 2)}
+                for row in rows
+            ]
+        return Response(facets)
 
 # doctors/views.py
 
@@ -251,12 +393,22 @@ class ReviewViewSet(viewsets.ModelViewSet):
     """
     Handles creating and viewing reviews.
     Supports filtering by doctor_id and 'mine=true' for current user.
+    Lists are keyset-paginated newest first and built from .values() rows.
     """
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    # (column, lookup) pairs for /reviews/export/: one JOIN brings the doctor's aggregates
+    export_columns = [
+        ('id', 'id'), ('doctor', 'doctor_id'), ('doctor_name', 'doctor__name'),
+        ('doctor_average_rating', 'doctor__average_rating'), ('doctor_review_count', 'doctor__review_count'),
+        ('user', 'user__username'), ('rating', 'rating'), ('comment', 'comment'), ('created_at', 'created_at'),
+    ]
 
     def get_queryset(self):
-        queryset = Review.objects.all()
+        # The serializer reads user.username and doctor.name: fetch them in the same query
+        queryset = Review.objects.select_related('user', 'doctor')
         
         # Filter by Doctor
         doctor_id = self.request.query_params.get('doctor_id')
@@ -272,23 +424,75 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
         return queryset.order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        # Plain tuples instead of model instances: no per-row object construction
+        rows = self.filter_queryset(self.get_queryset()).values(*ReviewListSerializer.value_fields)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(ReviewListSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsSiteAdmin])
+    def export(self, request):
+        """GET /reviews/export/?fmt=csv|ndjson -> every review (honours ?doctor_id=), admins only."""
+        fmt = export_format(request)
+        return stream_export(self.filter_queryset(self.get_queryset()), self.export_columns, fmt, 'reviews')
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user)
+            ratings.review_added(review.doctor_id, review.rating, review.created_at)
+
+    def perform_update(self, serializer):
+        # Capture the old values first: the doctor itself may be changed
+        old_doctor_id = serializer.instance.doctor_id
+        old_rating = serializer.instance.rating
+        with transaction.atomic():
+            review = serializer.save()
+            ratings.review_removed(old_doctor_id, old_rating, review.created_at)
+            ratings.review_added(review.doctor_id, review.rating, review.created_at)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            ratings.review_removed(instance.doctor_id, instance.rating, instance.created_at)
 
 class SavedDoctorViewSet(viewsets.ModelViewSet):
     """
     Manage user's saved doctors.
     GET /saved-doctors/ -> List all saved
     POST /saved-doctors/ -> Save a doctor (Body: {"doctor": 5})
+    POST /saved-doctors/bulk/ -> Save/unsave many (Body: {"save": [1, 2], "unsave": [3]})
     DELETE /saved-doctors/{id}/ -> Unsave
     """
     serializer_class = SavedDoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # Only show doctors saved by the current user
-        return SavedDoctor.objects.filter(user=self.request.user)
+        # Only show doctors saved by the current user.
+        # Rating aggregates are stored on Doctor, so one JOIN covers the nested payload.
+        return SavedDoctor.objects.filter(user=self.request.user).select_related('doctor')
 
     def perform_create(self, serializer):
         # Automatically assign the logged-in user
-        serializer.save(user=self.request.user)        
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = SavedDoctorBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        to_save = set(serializer.validated_data['save'])
+        to_unsave = set(serializer.validated_data['unsave'])
+
+        with transaction.atomic():
+            existing = set(Doctor.objects.filter(id__in=to_save).values_list('id', flat=True))
+            # ignore_conflicts: doctors that are already saved are left as they are
+            SavedDoctor.objects.bulk_create(
+                [SavedDoctor(user=request.user, doctor_id=doctor_id) for doctor_id in existing],
+                ignore_conflicts=True
+            )
+            SavedDoctor.objects.filter(user=request.user, doctor_id__in=to_unsave).delete()
+
+        return Response({
+            'saved': sorted(existing),
+            'unsaved': sorted(to_unsave),
+            'not_found': sorted(to_save - existing),
+        })        
\ No newline at end of file